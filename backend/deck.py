@@ -0,0 +1,407 @@
+"""PowerPoint rendering for Program Pulse exports.
+
+Everything here is synchronous and CPU bound; server.py runs it in the
+threadpool so the event loop stays responsive while a deck is built.
+"""
+from datetime import datetime
+from pathlib import Path
+from typing import List, Optional
+import tempfile
+
+from pptx import Presentation
+from pptx.chart.data import CategoryChartData
+from pptx.enum.chart import XL_CHART_TYPE, XL_LEGEND_POSITION
+from pptx.util import Inches, Pt
+from pptx.enum.text import PP_ALIGN
+from pptx.dml.color import RGBColor
+
+
+LOGO_PATH = Path(__file__).parent / 'lucy_logo.png'
+
+# Define colors (LucyRx theme)
+PURPLE = RGBColor(74, 65, 115)  # #4A4173
+LIGHT_PURPLE = RGBColor(107, 91, 149)  # #6B5B95
+CREAM = RGBColor(255, 249, 230)  # #FFF9E6
+WHITE = RGBColor(255, 255, 255)
+SECTION_FILL = RGBColor(245, 240, 255)
+NO_DATA_GREY = RGBColor(209, 213, 219)
+
+# Status colors
+STATUS_COLORS = {
+    'On Track': RGBColor(16, 185, 129),
+    'At Risk': RGBColor(245, 158, 11),
+    'Delayed': RGBColor(239, 68, 68),
+    'Completed': RGBColor(99, 102, 241)
+}
+
+# Bug severity colors, in display order
+SEVERITY_COLORS = [
+    ('critical', 'CRITICAL', RGBColor(220, 38, 38)),
+    ('high', 'HIGH', RGBColor(245, 158, 11)),
+    ('medium', 'MEDIUM', RGBColor(59, 130, 246)),
+    ('low', 'LOW', RGBColor(16, 185, 129))
+]
+
+
+def _new_presentation():
+    prs = Presentation()
+    prs.slide_width = Inches(10)
+    prs.slide_height = Inches(7.5)
+    return prs
+
+
+def _save(prs) -> str:
+    temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.pptx')
+    prs.save(temp_file.name)
+    temp_file.close()
+    return temp_file.name
+
+
+def _add_title_slide(prs, info_text: str):
+    title_slide_layout = prs.slide_layouts[6]  # Blank layout
+    title_slide = prs.slides.add_slide(title_slide_layout)
+
+    # Background for title slide
+    background = title_slide.background
+    fill = background.fill
+    fill.solid()
+    fill.fore_color.rgb = PURPLE
+
+    # Add logo
+    if LOGO_PATH.exists():
+        title_slide.shapes.add_picture(
+            str(LOGO_PATH),
+            Inches(4),
+            Inches(1.5),
+            width=Inches(2)
+        )
+
+    # Title
+    title_box = title_slide.shapes.add_textbox(
+        Inches(0.5), Inches(3.5), Inches(9), Inches(1)
+    )
+    title_frame = title_box.text_frame
+    title_frame.text = 'Program Pulse'
+    title_para = title_frame.paragraphs[0]
+    title_para.font.size = Pt(48)
+    title_para.font.bold = True
+    title_para.font.color.rgb = WHITE
+    title_para.alignment = PP_ALIGN.CENTER
+
+    # Subtitle
+    subtitle_box = title_slide.shapes.add_textbox(
+        Inches(0.5), Inches(4.5), Inches(9), Inches(0.5)
+    )
+    subtitle_frame = subtitle_box.text_frame
+    subtitle_frame.text = 'keeping a pulse on all LucyRx initiatives'
+    subtitle_para = subtitle_frame.paragraphs[0]
+    subtitle_para.font.size = Pt(18)
+    subtitle_para.font.italic = True
+    subtitle_para.font.color.rgb = WHITE
+    subtitle_para.alignment = PP_ALIGN.CENTER
+
+    # Date and project count
+    info_box = title_slide.shapes.add_textbox(
+        Inches(0.5), Inches(5.5), Inches(9), Inches(0.5)
+    )
+    info_frame = info_box.text_frame
+    info_frame.text = info_text
+    for para in info_frame.paragraphs:
+        para.font.size = Pt(14)
+        para.font.color.rgb = WHITE
+        para.alignment = PP_ALIGN.CENTER
+
+
+def _add_project_slide(prs, header: str, name: str, status: str):
+    """Add a cream slide with the header bar, project name and status badge"""
+    # Use blank layout
+    slide_layout = prs.slide_layouts[6]
+    slide = prs.slides.add_slide(slide_layout)
+
+    # Background
+    background = slide.background
+    fill = background.fill
+    fill.solid()
+    fill.fore_color.rgb = CREAM
+
+    # Header bar
+    header_shape = slide.shapes.add_shape(
+        1,  # Rectangle
+        Inches(0), Inches(0),
+        Inches(10), Inches(0.6)
+    )
+    header_shape.fill.solid()
+    header_shape.fill.fore_color.rgb = PURPLE
+    header_shape.line.fill.background()
+
+    # Add logo to header
+    if LOGO_PATH.exists():
+        slide.shapes.add_picture(
+            str(LOGO_PATH),
+            Inches(0.2),
+            Inches(0.15),
+            height=Inches(0.3)
+        )
+
+    # Project number
+    header_text = header_shape.text_frame
+    header_text.text = header
+    header_text.paragraphs[0].font.size = Pt(14)
+    header_text.paragraphs[0].font.color.rgb = WHITE
+    header_text.paragraphs[0].alignment = PP_ALIGN.RIGHT
+    header_text.margin_right = Inches(0.3)
+
+    # Project name
+    name_box = slide.shapes.add_textbox(
+        Inches(0.5), Inches(1), Inches(9), Inches(0.7)
+    )
+    name_frame = name_box.text_frame
+    name_frame.text = name or 'Unnamed Project'
+    name_para = name_frame.paragraphs[0]
+    name_para.font.size = Pt(32)
+    name_para.font.bold = True
+    name_para.font.color.rgb = PURPLE
+
+    # Status badge
+    status_color = STATUS_COLORS.get(status, STATUS_COLORS['On Track'])
+    status_shape = slide.shapes.add_shape(
+        1,  # Rectangle
+        Inches(0.5), Inches(1.8),
+        Inches(1.5), Inches(0.4)
+    )
+    status_shape.fill.solid()
+    status_shape.fill.fore_color.rgb = status_color
+    status_shape.line.fill.background()
+
+    status_text = status_shape.text_frame
+    status_text.text = status or 'On Track'
+    status_para = status_text.paragraphs[0]
+    status_para.font.size = Pt(14)
+    status_para.font.bold = True
+    status_para.font.color.rgb = WHITE
+    status_para.alignment = PP_ALIGN.CENTER
+
+    return slide
+
+
+def _add_label(slide, text: str, y: float):
+    label = slide.shapes.add_textbox(
+        Inches(0.5), Inches(y), Inches(9), Inches(0.3)
+    )
+    label_frame = label.text_frame
+    label_frame.text = text
+    label_frame.paragraphs[0].font.size = Pt(11)
+    label_frame.paragraphs[0].font.bold = True
+    label_frame.paragraphs[0].font.color.rgb = LIGHT_PURPLE
+
+
+def _add_footer(slide):
+    footer = slide.shapes.add_textbox(
+        Inches(0.5), Inches(7), Inches(9), Inches(0.3)
+    )
+    footer_frame = footer.text_frame
+    footer_frame.text = 'Generated by Program Pulse'
+    footer_para = footer_frame.paragraphs[0]
+    footer_para.font.size = Pt(10)
+    footer_para.font.italic = True
+    footer_para.font.color.rgb = LIGHT_PURPLE
+    footer_para.alignment = PP_ALIGN.CENTER
+
+
+def render_projects_deck(projects: List, date_text: Optional[str] = None) -> str:
+    """Render the projects deck to a temporary .pptx file and return its path"""
+    prs = _new_presentation()
+
+    date_text = date_text or datetime.now().strftime('%B %d, %Y')
+    _add_title_slide(
+        prs,
+        f'{date_text}\n{len(projects)} Active Project{"s" if len(projects) != 1 else ""}'
+    )
+
+    # Create slides for each project
+    for idx, project in enumerate(projects):
+        slide = _add_project_slide(
+            prs, f'Project {idx + 1} of {len(projects)}', project.name, project.status
+        )
+
+        y_pos = 2.4
+
+        # Helper function to add section
+        def add_section(title, content, y):
+            if not content or content == 'None' or content == 'NA':
+                return y
+
+            # Section box
+            section_shape = slide.shapes.add_shape(
+                1,  # Rectangle
+                Inches(0.5), Inches(y),
+                Inches(9), Inches(0.8)
+            )
+            section_shape.fill.solid()
+            section_shape.fill.fore_color.rgb = SECTION_FILL
+            section_shape.line.fill.background()
+
+            # Section text
+            text_frame = section_shape.text_frame
+            text_frame.margin_top = Inches(0.1)
+            text_frame.margin_left = Inches(0.2)
+            text_frame.margin_right = Inches(0.2)
+
+            # Title
+            p = text_frame.paragraphs[0]
+            p.text = title
+            p.font.size = Pt(11)
+            p.font.bold = True
+            p.font.color.rgb = LIGHT_PURPLE
+
+            # Content
+            p = text_frame.add_paragraph()
+            p.text = content
+            p.font.size = Pt(12)
+            p.font.color.rgb = PURPLE
+            p.space_before = Pt(2)
+
+            return y + 0.9
+
+        # Add sections
+        if project.completedThisWeek:
+            y_pos = add_section('COMPLETED THIS WEEK', project.completedThisWeek, y_pos)
+
+        if project.risks and project.risks != 'None' and project.risks != 'NA':
+            y_pos = add_section('RISKS', project.risks, y_pos)
+
+        if project.escalation and project.escalation != 'None':
+            y_pos = add_section('ESCALATION', project.escalation, y_pos)
+
+        if project.plannedNextWeek:
+            y_pos = add_section('PLANNED NEXT WEEK', project.plannedNextWeek, y_pos)
+
+        # Bug severity matrix
+        bugs = project.bugs
+        total_bugs = bugs.critical + bugs.high + bugs.medium + bugs.low
+
+        if total_bugs > 0 and y_pos < 6.5:
+            _add_label(slide, f'BUG SEVERITY MATRIX (Total: {total_bugs})', y_pos)
+
+            y_pos += 0.35
+
+            # Bug cards
+            x_pos = 0.5
+            for field, label, color in SEVERITY_COLORS:
+                card = slide.shapes.add_shape(
+                    1,  # Rectangle
+                    Inches(x_pos), Inches(y_pos),
+                    Inches(2), Inches(0.6)
+                )
+                card.fill.solid()
+                card.fill.fore_color.rgb = color
+                card.line.fill.background()
+
+                card_text = card.text_frame
+                card_text.vertical_anchor = 1  # Middle
+
+                # Label
+                p = card_text.paragraphs[0]
+                p.text = label
+                p.font.size = Pt(10)
+                p.font.bold = True
+                p.font.color.rgb = WHITE
+                p.alignment = PP_ALIGN.CENTER
+
+                # Count
+                p = card_text.add_paragraph()
+                p.text = str(getattr(bugs, field))
+                p.font.size = Pt(16)
+                p.font.bold = True
+                p.font.color.rgb = WHITE
+                p.alignment = PP_ALIGN.CENTER
+
+                x_pos += 2.2
+
+        _add_footer(slide)
+
+    return _save(prs)
+
+
+def _add_status_timeline(slide, weeks: List[dict], y: float):
+    """Draw the weekly statuses as one table row of colored cells with week labels.
+
+    A single table keeps the slide to one shape instead of two per week, which
+    matters for render time on long periods.
+    """
+    table_width = min(9.0, 0.8 * len(weeks))
+    table = slide.shapes.add_table(
+        1, len(weeks),
+        Inches(0.5), Inches(y), Inches(table_width), Inches(0.4)
+    ).table
+    table.first_row = False
+    for idx, week in enumerate(weeks):
+        cell = table.cell(0, idx)
+        cell.fill.solid()
+        cell.fill.fore_color.rgb = STATUS_COLORS.get(week['status'], NO_DATA_GREY) if week['status'] else NO_DATA_GREY
+        cell.margin_left = cell.margin_right = 0
+        cell.vertical_anchor = 1  # Middle
+        para = cell.text_frame.paragraphs[0]
+        para.text = week['label']
+        para.font.size = Pt(8)
+        para.font.bold = True
+        para.font.color.rgb = WHITE
+        para.alignment = PP_ALIGN.CENTER
+
+
+def _add_bug_trend_chart(slide, weeks: List[dict], y: float):
+    """Stacked column chart of open bugs per severity, one column per week"""
+    chart_data = CategoryChartData()
+    chart_data.categories = [week['label'] for week in weeks]
+    for field, label, _ in SEVERITY_COLORS:
+        chart_data.add_series(label.title(), [week['bugs'].get(field, 0) for week in weeks])
+
+    graphic_frame = slide.shapes.add_chart(
+        XL_CHART_TYPE.COLUMN_STACKED,
+        Inches(0.5), Inches(y), Inches(9), Inches(6.9 - y),
+        chart_data
+    )
+    chart = graphic_frame.chart
+    chart.has_legend = True
+    chart.legend.position = XL_LEGEND_POSITION.BOTTOM
+    chart.legend.include_in_layout = False
+    chart.legend.font.size = Pt(9)
+    chart.category_axis.tick_labels.font.size = Pt(8)
+    chart.value_axis.tick_labels.font.size = Pt(8)
+    chart.value_axis.has_major_gridlines = False
+    for series, (_, _, color) in zip(chart.series, SEVERITY_COLORS):
+        series.format.fill.solid()
+        series.format.fill.fore_color.rgb = color
+
+
+def render_period_deck(series: List[dict], period_label: str) -> str:
+    """Render the multi-week trend deck and return the .pptx path.
+
+    `series` holds one entry per project: its name, current status and a
+    `weeks` list (oldest first) of {'label', 'status', 'bugs'} end-of-week
+    states, where status is None for weeks before the project had data.
+    """
+    prs = _new_presentation()
+
+    week_count = len(series[0]['weeks']) if series else 0
+    _add_title_slide(
+        prs,
+        f'{period_label}\n{week_count} Weeks · {len(series)} Project{"s" if len(series) != 1 else ""}'
+    )
+
+    for idx, project in enumerate(series):
+        slide = _add_project_slide(
+            prs, f'Trend {idx + 1} of {len(series)}', project['name'], project['status']
+        )
+
+        _add_label(slide, 'STATUS OVER TIME', 2.4)
+        _add_status_timeline(slide, project['weeks'], 2.75)
+
+        weeks_with_data = [week for week in project['weeks'] if week['status']]
+        if any(sum(week['bugs'].values()) for week in weeks_with_data):
+            _add_label(slide, 'BUG SEVERITY TREND', 3.5)
+            _add_bug_trend_chart(slide, project['weeks'], 3.85)
+
+        _add_footer(slide)
+
+    return _save(prs)
@@ -0,0 +1,34 @@
+"""Gunicorn settings for running Program Pulse with several Uvicorn workers.
+
+    cd backend && gunicorn -c gunicorn.conf.py server:app
+
+`uvicorn server:app --workers N` works as well. Each worker opens its own
+storage connection in the app lifespan, and shared state (collection
+revisions) lives in storage, so workers need no coordination of their own.
+With MongoDB storage, set RATE_LIMIT_BACKEND=mongo so per-client rate limits
+are shared by all workers.
+
+Rate limits are off until RATE_LIMIT_TRUST_PROXY is set. Behind an ingress
+or load balancer, set it to the number of proxies in front of the app (1 for
+a single ingress), so clients are keyed by the address the ingress appended
+to X-Forwarded-For rather than by the ingress's own address. Set it to 0
+when clients connect to the workers directly.
+"""
+import multiprocessing
+import os
+
+bind = os.environ.get('BIND', '0.0.0.0:8001')
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count()))
+worker_class = 'uvicorn.workers.UvicornWorker'
+
+# Load the app in each worker after fork, never in the master
+preload_app = False
+
+# Deck exports can take a while; give in-flight requests time to drain on
+# SIGTERM before the worker is killed.
+graceful_timeout = int(os.environ.get('GRACEFUL_TIMEOUT', '60'))
+timeout = int(os.environ.get('WORKER_TIMEOUT', '120'))
+keepalive = 5
+
+accesslog = '-'
+errorlog = '-'
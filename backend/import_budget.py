@@ -0,0 +1,84 @@
+"""Report what importing server.py costs and fail when it exceeds a budget.
+
+    cd backend && python import_budget.py --budget-ms 1200
+
+Runs `python -X importtime -c "import server"` in a fresh interpreter, prints
+the most expensive top-level imports, and exits non-zero when the total is
+over budget or when a module that should load lazily (python-pptx, pandas,
+...) was imported at startup.
+"""
+import argparse
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).parent
+
+# Heavy dependencies that must only be imported on first use
+LAZY_MODULES = ("deck", "pptx", "lxml", "PIL", "xlsxwriter", "pandas", "numpy", "openpyxl")
+
+
+def measure(module: str) -> list:
+    """Return (self_us, cumulative_us, depth, name) for every import"""
+    env = dict(os.environ)
+    # server.py only reads these at import; no connection is made
+    env.setdefault('MONGO_URL', 'mongodb://localhost:27017')
+    env.setdefault('DB_NAME', 'import_budget')
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        sys.exit(f"Importing {module} failed:\n{result.stderr}")
+
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        # One space after the bar, then two per nesting level
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        rows.append((int(self_us), int(cumulative_us), depth, name.strip()))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--module', default='server')
+    parser.add_argument('--budget-ms', type=float, default=1500)
+    parser.add_argument('--top', type=int, default=15)
+    args = parser.parse_args()
+
+    rows = measure(args.module)
+    target_index = next(index for index, row in enumerate(rows) if row[3] == args.module and row[2] == 0)
+    target = rows[target_index]
+    total_ms = target[1] / 1000
+
+    # -X importtime prints children before their parent, so the module's own
+    # imports are the depth-1 rows since the previous top-level row
+    dependencies = []
+    for row in reversed(rows[:target_index]):
+        if row[2] == 0:
+            break
+        if row[2] == 1:
+            dependencies.append(row)
+
+    print(f"{'cumulative ms':>14}  {'self ms':>8}  module")
+    for self_us, cumulative_us, _, name in sorted(dependencies, key=lambda row: row[1], reverse=True)[:args.top]:
+        print(f"{cumulative_us / 1000:14.1f}  {self_us / 1000:8.1f}  {name}")
+    print(f"{total_ms:14.1f}  {target[0] / 1000:8.1f}  {args.module} (total)")
+
+    failed = False
+    eager = sorted({row[3] for row in rows if row[3].split('.')[0] in LAZY_MODULES})
+    if eager:
+        print(f"\nImported at startup but expected to load lazily: {', '.join(eager[:10])}")
+        failed = True
+    if total_ms > args.budget_ms:
+        print(f"\nImport took {total_ms:.0f} ms, over the {args.budget_ms:.0f} ms budget")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,170 @@
+"""Outbound notifications for project status changes and escalations.
+
+Requests only append an event to the notification outbox. Everything else
+happens in NotificationDispatcher.run_once(), which the app runs as a leased
+background job:
+
+1. Outbox events are matched against the subscriptions and appended to one
+   open batch per recipient.
+2. A batch is sent once no event has joined it for `debounce_seconds`, or
+   `max_delay_seconds` after it opened, whichever comes first. A burst of
+   edits therefore arrives as one webhook call or email.
+3. Failed sends are retried with exponential backoff until `max_attempts`,
+   after which the batch is kept with state "failed".
+
+Webhooks are POSTed as JSON with httpx. Email goes through smtplib in a worker
+thread. Point SMTP_HOST/SMTP_PORT at a local stand-in such as
+`python -m aiosmtpd -n -l localhost:1025` to test without a mail server.
+"""
+from datetime import datetime, timedelta, timezone
+from email.message import EmailMessage
+from typing import List, Optional
+import asyncio
+import logging
+import smtplib
+
+logger = logging.getLogger(__name__)
+
+ALERT_STATUSES = ("At Risk", "Delayed")
+
+
+def notification_kinds(before: dict, after: dict) -> List[str]:
+    """What an edit from `before` to `after` should notify about"""
+    kinds = []
+    if after.get("status") in ALERT_STATUSES and after.get("status") != before.get("status"):
+        kinds.append("status")
+    escalation = (after.get("escalation") or "").strip()
+    if escalation and escalation != "None" and escalation != (before.get("escalation") or "").strip():
+        kinds.append("escalation")
+    return kinds
+
+
+def subscription_matches(subscription: dict, event: dict) -> bool:
+    project_ids = subscription.get("projectIds")
+    if project_ids and event["projectId"] not in project_ids:
+        return False
+    return any(kind in subscription.get("kinds", ()) for kind in event["kinds"])
+
+
+def describe_event(event: dict) -> str:
+    lines = []
+    if "status" in event["kinds"]:
+        lines.append(f"{event['projectName']} is now {event['status']['to']} (was {event['status']['from']})")
+    if "escalation" in event["kinds"]:
+        lines.append(f"{event['projectName']} escalation: {event['escalation']}")
+    return "\n".join(lines)
+
+
+def build_email(batch: dict, sender: str) -> EmailMessage:
+    events = batch["events"]
+    message = EmailMessage()
+    message["From"] = sender
+    message["To"] = batch["target"]
+    if len(events) == 1:
+        message["Subject"] = f"Program Pulse: {describe_event(events[0]).splitlines()[0]}"
+    else:
+        message["Subject"] = f"Program Pulse: {len(events)} project updates"
+    message.set_content("\n\n".join(
+        f"{describe_event(event)}\n({event['createdAt']})" for event in events
+    ))
+    return message
+
+
+class NotificationDispatcher:
+    def __init__(
+        self,
+        storage,
+        debounce_seconds: float = 60,
+        max_delay_seconds: float = 300,
+        retry_base_seconds: float = 30,
+        retry_max_seconds: float = 3600,
+        max_attempts: int = 8,
+        timeout: float = 10,
+        smtp: Optional[dict] = None,
+        batch_limit: int = 100
+    ):
+        self.storage = storage
+        self.debounce_seconds = debounce_seconds
+        self.max_delay_seconds = max_delay_seconds
+        self.retry_base_seconds = retry_base_seconds
+        self.retry_max_seconds = retry_max_seconds
+        self.max_attempts = max_attempts
+        self.timeout = timeout
+        self.smtp = smtp or {}
+        self.batch_limit = batch_limit
+        # Claims older than this are assumed to belong to a worker that died
+        self.stale_seconds = max(60.0, timeout * 3)
+
+    def backoff(self, attempts: int) -> float:
+        return min(self.retry_max_seconds, self.retry_base_seconds * 2 ** (attempts - 1))
+
+    async def run_once(self):
+        now = datetime.now(timezone.utc)
+        stale_before = (now - timedelta(seconds=self.stale_seconds)).isoformat()
+
+        events = await self.storage.claim_notification_events(stale_before, limit=500)
+        if events:
+            subscriptions = await self.storage.find("notification_subscriptions")
+            for event in events:
+                payload = {key: value for key, value in event.items() if key != "dispatchedAt"}
+                for subscription in subscriptions:
+                    if subscription_matches(subscription, event):
+                        recipient = {
+                            "recipient": f"{subscription['channel']}:{subscription['target']}",
+                            "channel": subscription["channel"],
+                            "target": subscription["target"]
+                        }
+                        await self.storage.add_to_notification_batch(recipient, payload, now.isoformat())
+                await self.storage.delete("notification_outbox", event["id"])
+
+        batches = await self.storage.claim_notification_batches(
+            now.isoformat(),
+            quiet_before=(now - timedelta(seconds=self.debounce_seconds)).isoformat(),
+            opened_before=(now - timedelta(seconds=self.max_delay_seconds)).isoformat(),
+            stale_before=stale_before,
+            limit=self.batch_limit
+        )
+        if not batches:
+            return
+
+        import httpx
+
+        async with httpx.AsyncClient(timeout=self.timeout) as http:
+            await asyncio.gather(*(self.deliver(batch, http) for batch in batches))
+
+    async def deliver(self, batch: dict, http):
+        try:
+            if batch["channel"] == "webhook":
+                response = await http.post(batch["target"], json={
+                    "recipient": batch["target"],
+                    "count": len(batch["events"]),
+                    "notifications": batch["events"]
+                })
+                response.raise_for_status()
+            else:
+                await asyncio.to_thread(self.send_email, batch)
+        except Exception as e:
+            attempts = batch.get("attempts", 0) + 1
+            failed = attempts >= self.max_attempts
+            retry_at = datetime.now(timezone.utc) + timedelta(seconds=self.backoff(attempts))
+            await self.storage.update("notification_batches", batch["id"], {
+                "state": "failed" if failed else "retry",
+                "attempts": attempts,
+                "nextAttemptAt": None if failed else retry_at.isoformat(),
+                "lastError": str(e)[:500]
+            })
+            logger.warning(
+                "Notification to %s failed (attempt %d%s): %s",
+                batch["recipient"], attempts, ", giving up" if failed else "", e
+            )
+            return
+        await self.storage.delete("notification_batches", batch["id"])
+
+    def send_email(self, batch: dict):
+        message = build_email(batch, self.smtp.get("sender", "program-pulse@localhost"))
+        with smtplib.SMTP(self.smtp.get("host", "localhost"), self.smtp.get("port", 25), timeout=self.timeout) as smtp:
+            if self.smtp.get("starttls"):
+                smtp.starttls()
+            if self.smtp.get("username"):
+                smtp.login(self.smtp["username"], self.smtp.get("password", ""))
+            smtp.send_message(message)
@@ -0,0 +1,236 @@
+"""Live diagnostics for Program Pulse.
+
+- SamplingProfiler walks every thread's stack at a fixed interval and counts
+  collapsed stacks ("a;b;c 12" lines), the input format of flamegraph.pl and
+  speedscope.
+- DiagnosticsMiddleware times each request and breaks its MongoDB time down
+  per command. It keeps the slowest recent requests in a ring buffer and, on
+  request, profiles the worker while a single request runs. Those samples
+  cover every thread of the worker: concurrent requests interleave on the
+  event loop thread and share the threadpool, so their stacks cannot be
+  told apart. Each profile records how many other requests overlapped it.
+- MongoCommandListener is a pymongo command listener that attributes commands
+  to the request that issued them. Motor runs pymongo calls with a copy of the
+  caller's context, so the request's trace is visible from its worker thread.
+"""
+from collections import Counter, deque
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Callable, Optional
+import os
+import sys
+import threading
+import time
+import uuid
+
+from pymongo import monitoring
+
+
+current_trace: ContextVar[Optional["RequestTrace"]] = ContextVar("current_trace", default=None)
+
+
+class RequestTrace:
+    """Mongo time spent on behalf of one HTTP request"""
+
+    def __init__(self):
+        self.mongo = {}
+
+    def record(self, command: str, collection: str, duration_ms: float):
+        key = f"{command} {collection}".strip()
+        stats = self.mongo.setdefault(key, {"calls": 0, "ms": 0.0})
+        stats["calls"] += 1
+        stats["ms"] += duration_ms
+
+    def breakdown(self) -> list:
+        return sorted(
+            ({"command": key, "calls": stats["calls"], "ms": round(stats["ms"], 2)} for key, stats in self.mongo.items()),
+            key=lambda item: item["ms"],
+            reverse=True
+        )
+
+
+class MongoCommandListener(monitoring.CommandListener):
+    def __init__(self):
+        self._pending = {}
+
+    def started(self, event):
+        trace = current_trace.get()
+        if trace is None:
+            return
+        target = event.command.get(event.command_name)
+        collection = target if isinstance(target, str) else ""
+        self._pending[(event.connection_id, event.request_id)] = (trace, collection)
+
+    def succeeded(self, event):
+        self._finish(event)
+
+    def failed(self, event):
+        self._finish(event)
+
+    def _finish(self, event):
+        entry = self._pending.pop((event.connection_id, event.request_id), None)
+        if entry is not None:
+            trace, collection = entry
+            trace.record(event.command_name, collection, event.duration_micros / 1000)
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """Samples the stacks of all other threads until stopped"""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample_once(self, own_id: int, names: dict):
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own_id:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame))
+                frame = frame.f_back
+            stack.append(names.get(thread_id, f"thread-{thread_id}"))
+            self.stacks[";".join(reversed(stack))] += 1
+        self.samples += 1
+
+    def _run(self):
+        own_id = threading.get_ident()
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        while not self._stop.is_set():
+            self._sample_once(own_id, names)
+            self._stop.wait(self.interval)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> str:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        return self.collapsed()
+
+    def run_for(self, seconds: float) -> str:
+        """Sample for a fixed time (blocking) and return collapsed stacks"""
+        self.start()
+        time.sleep(seconds)
+        return self.stop()
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+class DiagnosticsLog:
+    """Ring buffers of slow requests and request profiles for this worker"""
+
+    def __init__(self, slow_ms: float = 500, slow_log_size: int = 50, profile_log_size: int = 20):
+        self.slow_ms = slow_ms
+        self.slow_requests = deque(maxlen=slow_log_size)
+        self.profiles = deque(maxlen=profile_log_size)
+
+    def record(self, entry: dict):
+        if entry["ms"] >= self.slow_ms:
+            self.slow_requests.append(entry)
+
+    def slowest(self) -> list:
+        return sorted(self.slow_requests, key=lambda entry: entry["ms"], reverse=True)
+
+    def find_profile(self, profile_id: str) -> Optional[dict]:
+        for profile in self.profiles:
+            if profile["id"] == profile_id:
+                return profile
+        return None
+
+
+class DiagnosticsMiddleware:
+    """Times every request and profiles requests flagged with X-Profile: 1.
+
+    `authorize(headers)` decides whether a flagged request may be profiled;
+    profiling is an admin facility, so it is checked on every flagged request.
+    A profile samples the whole worker while the request runs, so only one
+    with `overlapping` (other requests in flight meanwhile) at 0 is clean.
+    """
+
+    def __init__(
+        self,
+        app,
+        log: DiagnosticsLog,
+        authorize: Callable[[dict], bool],
+        profile_interval: float = 0.005,
+        skip_prefixes: tuple = ()
+    ):
+        self.app = app
+        self.log = log
+        self.authorize = authorize
+        self.profile_interval = profile_interval
+        self.skip_prefixes = skip_prefixes
+        self.active = 0  # Requests in flight
+        self.started = 0  # Requests ever started
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith(self.skip_prefixes):
+            await self.app(scope, receive, send)
+            return
+
+        self.active += 1
+        self.started += 1
+        headers = {key.decode("latin-1").lower(): value.decode("latin-1") for key, value in scope["headers"]}
+        profiler = None
+        profile_id = None
+        if headers.get("x-profile") == "1" and self.authorize(headers):
+            profile_id = uuid.uuid4().hex[:12]
+            running_before = self.active - 1
+            started_before = self.started
+            profiler = SamplingProfiler(self.profile_interval)
+            profiler.start()
+
+        status_code = 0
+
+        async def send_traced(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                if profile_id:
+                    message["headers"] = list(message.get("headers", [])) + [(b"x-profile-id", profile_id.encode())]
+            await send(message)
+
+        trace = RequestTrace()
+        token = current_trace.set(trace)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_traced)
+        finally:
+            duration_ms = (time.perf_counter() - started) * 1000
+            current_trace.reset(token)
+            self.active -= 1
+
+            entry = {
+                "method": scope["method"],
+                "path": scope["path"],
+                "query": scope.get("query_string", b"").decode("latin-1"),
+                "status": status_code,
+                "ms": round(duration_ms, 2),
+                "mongo": trace.breakdown(),
+                "at": datetime.now(timezone.utc).isoformat()
+            }
+            if profiler is not None:
+                folded = profiler.stop()
+                entry["profileId"] = profile_id
+                self.log.profiles.append({
+                    "id": profile_id,
+                    "request": entry,
+                    "samples": profiler.samples,
+                    "scope": "worker",
+                    # Requests already running plus those started before this one ended
+                    "overlapping": running_before + self.started - started_before,
+                    "folded": folded
+                })
+            self.log.record(entry)
@@ -1,32 +1,166 @@
-from fastapi import FastAPI, APIRouter, HTTPException
-from fastapi.responses import FileResponse
+from fastapi import FastAPI, APIRouter, Depends, File, HTTPException, Query, Request, Response, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, ORJSONResponse, StreamingResponse
 from dotenv import load_dotenv
+from starlette.background import BackgroundTask
+from starlette.datastructures import Headers, MutableHeaders
 from starlette.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument
 import os
+import math
+import socket
+import time
+import asyncio
 import logging
+from contextlib import asynccontextmanager
 from pathlib import Path
-from pydantic import BaseModel, Field, ConfigDict
-from typing import List, Optional
+from pydantic import BaseModel, Field, ConfigDict, TypeAdapter, ValidationError
+from typing import List, Literal, Optional
+from collections import OrderedDict
 import uuid
-from datetime import datetime, timezone
-from pptx import Presentation
-from pptx.util import Inches, Pt
-from pptx.enum.text import PP_ALIGN
-from pptx.dml.color import RGBColor
-import tempfile
+import difflib
+import hashlib
+import hmac
+import zipfile
+import zlib
+from email.utils import format_datetime, parsedate_to_datetime
+from datetime import date, datetime, time as dt_time, timedelta, timezone
+import orjson
+from profiling import DiagnosticsLog, DiagnosticsMiddleware, MongoCommandListener, SamplingProfiler
+from storage import MongoStorage, SQLiteStorage, iso_week_key
+from notifications import NotificationDispatcher, notification_kinds
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, gzip is always available
+    brotli = None
 
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
-# MongoDB connection
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+# Storage
+# STORAGE_BACKEND=mongo (the default) keeps data in MONGO_URL/DB_NAME;
+# STORAGE_BACKEND=sqlite keeps it in the local file SQLITE_PATH and needs no
+# database service (see storage.py). Storage is opened in the lifespan handler
+# rather than at import, so every worker process (Gunicorn/uvicorn --workers)
+# gets its own connection pool created after fork.
+STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND', 'mongo').lower()
+storage = None
+
+# Attributes Mongo command time to the request that issued it (see profiling.py)
+mongo_listener = MongoCommandListener()
+
+
+def create_storage():
+    if STORAGE_BACKEND == "sqlite":
+        return SQLiteStorage(os.environ.get('SQLITE_PATH', str(ROOT_DIR / 'program_pulse.db')))
+    if STORAGE_BACKEND == "mongo":
+        return MongoStorage(os.environ['MONGO_URL'], os.environ['DB_NAME'], event_listeners=[mongo_listener])
+    raise RuntimeError(f"Unknown STORAGE_BACKEND {STORAGE_BACKEND!r} (expected mongo or sqlite)")
+
+# Seconds shutdown waits for in-flight exports to finish
+SHUTDOWN_DRAIN_SECONDS = float(os.environ.get('SHUTDOWN_DRAIN_SECONDS', '30'))
+
+
+class InflightTracker:
+    """Counts running jobs so shutdown can wait for them to drain"""
+    
+    def __init__(self):
+        self._count = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+    
+    @property
+    def count(self) -> int:
+        return self._count
+    
+    @asynccontextmanager
+    async def track(self):
+        self._count += 1
+        self._idle.clear()
+        try:
+            yield
+        finally:
+            self._count -= 1
+            if self._count == 0:
+                self._idle.set()
+    
+    async def wait_idle(self, timeout: float) -> bool:
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+
+inflight_exports = InflightTracker()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global storage
+    storage = create_storage()
+    await storage.open()
+    if not RATE_LIMIT_ENABLED:
+        logger.warning("Rate limits are off until RATE_LIMIT_TRUST_PROXY is set")
+    await ensure_event_counts()
+    background_tasks = start_background_jobs()
+    try:
+        yield
+    finally:
+        for task in background_tasks:
+            task.cancel()
+        await asyncio.gather(*background_tasks, return_exceptions=True)
+        if not await inflight_exports.wait_idle(SHUTDOWN_DRAIN_SECONDS):
+            logger.warning("Shutting down with %d export(s) still running", inflight_exports.count)
+        await storage.close()
+
+
+# Background jobs
+# Periodic jobs run in every worker, but each run first takes a lease in
+# storage so only one worker does the work per interval.
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+
+async def acquire_lease(name: str, seconds: float) -> bool:
+    expires_at = datetime.now(timezone.utc) + timedelta(seconds=seconds)
+    return await storage.acquire_lease(name, WORKER_ID, expires_at)
+
+
+async def run_periodically(name: str, interval: float, job):
+    while True:
+        try:
+            if await acquire_lease(name, interval):
+                await job()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Background job %s failed", name)
+        await asyncio.sleep(interval)
+
+
+def start_background_jobs() -> List[asyncio.Task]:
+    tasks = []
+    if PREWARM_EXPORTS:
+        tasks.append(asyncio.create_task(prewarm_exports()))
+    if HISTORY_COMPACTION_INTERVAL > 0:
+        tasks.append(asyncio.create_task(
+            run_periodically("history_compaction", HISTORY_COMPACTION_INTERVAL, compact_history)
+        ))
+    if WEEKLY_SNAPSHOT_INTERVAL > 0:
+        tasks.append(asyncio.create_task(
+            run_periodically("close_week", WEEKLY_SNAPSHOT_INTERVAL, close_week)
+        ))
+    if NOTIFY_POLL_SECONDS > 0:
+        tasks.append(asyncio.create_task(
+            run_periodically("notifications", NOTIFY_POLL_SECONDS, create_dispatcher().run_once)
+        ))
+    return tasks
+
 
 # Create the main app without a prefix
-app = FastAPI()
+app = FastAPI(default_response_class=ORJSONResponse, lifespan=lifespan)
 
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
@@ -38,6 +172,8 @@ class BugSeverity(BaseModel):
     medium: int = 0
     low: int = 0
 
+BUG_FIELDS = tuple(BugSeverity.model_fields)
+
 class Project(BaseModel):
     model_config = ConfigDict(extra="ignore")
     
@@ -93,6 +229,16 @@ class CalendarEventCreate(BaseModel):
     projectId: Optional[str] = None
     color: str = "#667eea"  # Default purple color
 
+class ProjectSummary(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+    
+    id: str
+    name: str
+    status: str
+
+class CalendarEventWithProject(CalendarEvent):
+    project: Optional[ProjectSummary] = None
+
 class ProjectHistory(BaseModel):
     model_config = ConfigDict(extra="ignore")
     
@@ -106,6 +252,405 @@ class ProjectHistory(BaseModel):
     plannedNextWeek: str = ""
     bugs: BugSeverity = Field(default_factory=BugSeverity)
     updatedAt: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    coalescedEdits: int = 0  # Later edits folded into this snapshot
+    lastEditAt: Optional[datetime] = None
+
+class NotificationSubscriptionCreate(BaseModel):
+    channel: Literal["webhook", "email"]
+    target: str  # Webhook URL or email address
+    projectIds: Optional[List[str]] = None  # None for every project
+    kinds: List[Literal["status", "escalation"]] = Field(default_factory=lambda: ["status", "escalation"])
+
+class NotificationSubscription(NotificationSubscriptionCreate):
+    model_config = ConfigDict(extra="ignore")
+    
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    createdAt: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+
+# Serialization fast path
+# List routes return an ORJSONResponse directly so FastAPI skips its own
+# response_model validation. Routes named in TRUSTED_READ_ROUTES encode the
+# stored documents as-is (projected down to the model's fields) after filling
+# in the model defaults older documents lack and writing UTC timestamps the
+# way pydantic does ("Z" rather than "+00:00"), so both paths return the same
+# JSON. The others are validated once through a TypeAdapter before encoding.
+TRUSTED_READ_ROUTES = {
+    route.strip()
+    for route in os.environ.get('TRUSTED_READ_ROUTES', 'projects,events,history').split(',')
+    if route.strip()
+}
+
+
+class ListSerializer:
+    """Serializes lists of one model, validated or trusted"""
+    
+    def __init__(self, model):
+        self.adapter = TypeAdapter(List[model])
+        self.defaults = {}
+        self.timestamps = []
+        for name, field in model.model_fields.items():
+            if field.annotation in (datetime, Optional[datetime]):
+                self.timestamps.append(name)
+            if field.default_factory is None:
+                if not field.is_required():
+                    self.defaults[name] = field.default
+            else:
+                # Only nested models have a deterministic factory default; ids
+                # and timestamps are always stored
+                value = field.default_factory()
+                if isinstance(value, BaseModel):
+                    self.defaults[name] = value.model_dump(mode="json")
+    
+    def trusted(self, docs: list) -> list:
+        for doc in docs:
+            for name, value in self.defaults.items():
+                if name not in doc:
+                    doc[name] = value
+            for name in self.timestamps:
+                value = doc.get(name)
+                if isinstance(value, str) and value.endswith("+00:00"):
+                    doc[name] = value[:-6] + "Z"
+        return docs
+    
+    def validated(self, docs: list) -> list:
+        return self.adapter.dump_python(self.adapter.validate_python(docs), mode="json")
+
+
+project_list_serializer = ListSerializer(Project)
+event_list_serializer = ListSerializer(CalendarEvent)
+expanded_event_list_serializer = ListSerializer(CalendarEventWithProject)
+history_list_serializer = ListSerializer(ProjectHistory)
+
+
+def model_fields(model) -> tuple:
+    """The fields exposed by a model, for reading documents projected down to them"""
+    return tuple(model.model_fields)
+
+
+def list_response(route: str, docs: list, serializer: ListSerializer, headers: Optional[dict] = None) -> ORJSONResponse:
+    """Serialize a list of documents once, validating only untrusted routes"""
+    if route in TRUSTED_READ_ROUTES:
+        return ORJSONResponse(serializer.trusted(docs), headers=headers)
+    return ORJSONResponse(serializer.validated(docs), headers=headers)
+
+
+# Conditional GET
+# Every write bumps a per-collection revision counter kept in storage, so all
+# workers agree on it. Read routes derive a strong ETag and Last-Modified from
+# the revisions they depend on and answer 304 without touching the data.
+async def bump_revision(*collections: str):
+    """Record a write to the given collections"""
+    await storage.bump_revision(*collections)
+
+
+async def collection_validators(*collections: str, variant: str = "") -> dict:
+    """Build ETag/Last-Modified headers from the revisions of some collections"""
+    revisions = await storage.get_revisions(list(collections))
+    
+    tag_source = ";".join(f"{name}:{revisions.get(name, {}).get('rev', 0)}" for name in collections)
+    etag = hashlib.sha1(f"{tag_source}|{variant}".encode()).hexdigest()[:20]
+    headers = {"ETag": f'"{etag}"', "Cache-Control": "no-cache"}
+    
+    # Last-Modified has one-second precision, so it is only sent once its
+    # second is over; otherwise a second write within that second would
+    # leave an If-Modified-Since client with a stale 304.
+    modified = [datetime.fromisoformat(doc["updatedAt"]) for doc in revisions.values() if doc.get("updatedAt")]
+    if modified and max(modified) < datetime.now(timezone.utc).replace(microsecond=0):
+        headers["Last-Modified"] = format_datetime(max(modified).astimezone(timezone.utc), usegmt=True)
+    return headers
+
+
+def is_not_modified(request: Request, headers: dict) -> bool:
+    """Evaluate If-None-Match, falling back to If-Modified-Since"""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        if if_none_match.strip() == "*":
+            return True
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        return headers.get("ETag") in tags
+    
+    if_modified_since = request.headers.get("if-modified-since")
+    last_modified = headers.get("Last-Modified")
+    if if_modified_since and last_modified:
+        try:
+            return parsedate_to_datetime(last_modified) <= parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def not_modified_response(headers: dict) -> Response:
+    return Response(status_code=304, headers=headers)
+
+
+# Rate limiting and admission control
+# Token buckets are kept per client and per route class. RATE_LIMIT_<CLASS>
+# takes "<requests>/<seconds>" (or "off"). With RATE_LIMIT_BACKEND=mongo the
+# buckets live in the rate_limits collection so the limits hold across
+# workers (this needs STORAGE_BACKEND=mongo); the default keeps them in
+# process memory.
+# Limits stay off until RATE_LIMIT_TRUST_PROXY says how clients are told
+# apart, since behind an ingress every request comes from the ingress
+# address. Set it to the number of reverse proxies in front of the app
+# ("true" meaning one): the client is then the address the outermost trusted
+# proxy appended to X-Forwarded-For, counting from the right, since entries
+# to its left are client-supplied. Set it to 0 when clients connect directly.
+RATE_LIMIT_BACKEND = os.environ.get('RATE_LIMIT_BACKEND', 'memory')
+if RATE_LIMIT_BACKEND == "mongo" and STORAGE_BACKEND != "mongo":
+    raise RuntimeError("RATE_LIMIT_BACKEND=mongo requires STORAGE_BACKEND=mongo")
+RATE_LIMIT_TRUST_PROXY = os.environ.get('RATE_LIMIT_TRUST_PROXY', '').strip().lower()
+RATE_LIMIT_ENABLED = RATE_LIMIT_TRUST_PROXY != ''
+RATE_LIMIT_TRUSTED_HOPS = (
+    1 if RATE_LIMIT_TRUST_PROXY in ('true', 'yes')
+    else int(RATE_LIMIT_TRUST_PROXY) if RATE_LIMIT_TRUST_PROXY.isdigit()
+    else 0
+)
+RATE_LIMIT_DEFAULTS = {
+    "export": "10/60",
+    "list": "120/60",
+    "import": "5/60",
+}
+
+# Exports allowed to render at once in this worker before new ones are shed
+EXPORT_CONCURRENCY = int(os.environ.get('EXPORT_CONCURRENCY', '2'))
+EXPORT_RETRY_AFTER = int(os.environ.get('EXPORT_RETRY_AFTER', '5'))
+
+
+def parse_rate_limit(value: str) -> Optional[tuple]:
+    """Parse "<requests>/<seconds>" into (capacity, tokens per second)"""
+    if value.strip().lower() in ('', '0', 'off', 'none'):
+        return None
+    requests, _, seconds = value.partition('/')
+    capacity = float(requests)
+    return capacity, capacity / float(seconds or 1)
+
+
+RATE_LIMITS = {
+    route_class: parse_rate_limit(os.environ.get(f'RATE_LIMIT_{route_class.upper()}', default)) if RATE_LIMIT_ENABLED else None
+    for route_class, default in RATE_LIMIT_DEFAULTS.items()
+}
+
+
+class MemoryRateLimiter:
+    """Token buckets held in this process, at most max_buckets of them"""
+    
+    max_buckets = 10000
+    
+    def __init__(self, limits: dict):
+        self.limits = limits
+        self._buckets = OrderedDict()  # Least recently used first
+    
+    async def acquire(self, route_class: str, client_id: str) -> float:
+        """Take a token; return 0 when allowed, otherwise seconds until one is available"""
+        limit = self.limits.get(route_class)
+        if limit is None:
+            return 0
+        capacity, rate = limit
+        
+        now = time.monotonic()
+        key = (route_class, client_id)
+        tokens, updated = self._buckets.get(key, (capacity, now))
+        tokens = min(capacity, tokens + (now - updated) * rate)
+        
+        allowed = tokens >= 1
+        self._buckets[key] = (tokens - 1 if allowed else tokens, now)
+        self._buckets.move_to_end(key)
+        while len(self._buckets) > self.max_buckets:
+            # The least recently seen client's bucket has most likely refilled
+            self._buckets.popitem(last=False)
+        return 0 if allowed else (1 - tokens) / rate
+
+
+class MongoRateLimiter:
+    """Token buckets stored in MongoDB and updated atomically, shared by all workers"""
+    
+    def __init__(self, limits: dict):
+        self.limits = limits
+    
+    async def acquire(self, route_class: str, client_id: str) -> float:
+        limit = self.limits.get(route_class)
+        if limit is None:
+            return 0
+        capacity, rate = limit
+        
+        # Refill and take a token in one pipeline update, timed by the server clock
+        elapsed = {"$divide": [{"$subtract": ["$$NOW", {"$ifNull": ["$ts", "$$NOW"]}]}, 1000]}
+        refilled = {"$min": [capacity, {"$add": [{"$ifNull": ["$tokens", capacity]}, {"$multiply": [elapsed, rate]}]}]}
+        idle_ms = int(capacity / rate * 1000)
+        bucket = await storage.db.rate_limits.find_one_and_update(
+            {"_id": f"{route_class}:{client_id}"},
+            [
+                {"$set": {"tokens": refilled, "ts": "$$NOW"}},
+                {"$set": {"allowed": {"$gte": ["$tokens", 1]}}},
+                {"$set": {
+                    "tokens": {"$cond": ["$allowed", {"$subtract": ["$tokens", 1]}, "$tokens"]},
+                    "expiresAt": {"$add": ["$$NOW", idle_ms]},
+                }},
+            ],
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        if bucket["allowed"]:
+            return 0
+        return (1 - bucket["tokens"]) / rate
+
+
+rate_limiter = MongoRateLimiter(RATE_LIMITS) if RATE_LIMIT_BACKEND == "mongo" else MemoryRateLimiter(RATE_LIMITS)
+
+
+def client_id(request: Request) -> str:
+    if RATE_LIMIT_TRUSTED_HOPS:
+        forwarded_for = [hop.strip() for hop in request.headers.get("x-forwarded-for", "").split(",") if hop.strip()]
+        if len(forwarded_for) >= RATE_LIMIT_TRUSTED_HOPS:
+            return forwarded_for[-RATE_LIMIT_TRUSTED_HOPS]
+    return request.client.host if request.client else "unknown"
+
+
+def rate_limit(route_class: str):
+    """Dependency that answers 429 once a client exhausts its bucket for a route class"""
+    async def check_rate_limit(request: Request):
+        retry_after = await rate_limiter.acquire(route_class, client_id(request))
+        if retry_after > 0:
+            raise HTTPException(
+                status_code=429,
+                detail="Rate limit exceeded",
+                headers={"Retry-After": str(math.ceil(retry_after))}
+            )
+    return check_rate_limit
+
+
+# Response compression
+# Negotiates brotli (when installed) or gzip for textual responses over a size
+# threshold. Streaming bodies are compressed incrementally.
+COMPRESSION_MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE', '1024'))
+COMPRESSIBLE_TYPES = ("application/json", "text/")
+
+
+class _GzipCompressor:
+    def __init__(self, level: int = 6):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+    
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+    
+    def flush(self) -> bytes:
+        return self._compressor.flush()
+
+
+class _BrotliCompressor:
+    def __init__(self, quality: int = 4):
+        self._compressor = brotli.Compressor(quality=quality)
+    
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data)
+    
+    def flush(self) -> bytes:
+        return self._compressor.finish()
+
+
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    """Pick the best supported content-coding from an Accept-Encoding header"""
+    offered = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if name:
+            offered[name.lower()] = quality
+    
+    if brotli is not None and offered.get("br", 0) > 0:
+        return "br"
+    if offered.get("gzip", 0) > 0:
+        return "gzip"
+    return None
+
+
+class CompressionMiddleware:
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        
+        start_message = None
+        compressor = None
+        passthrough = False
+        
+        async def send_compressed(message):
+            nonlocal start_message, compressor, passthrough
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                # Anything but a body (e.g. http.response.pathsend, which
+                # FileResponse sends instead of one) goes out untouched,
+                # after the response start held back for it
+                if start_message is not None and not passthrough:
+                    passthrough = True
+                    await send(start_message)
+                await send(message)
+                return
+            
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            
+            if compressor is None:
+                headers = MutableHeaders(raw=start_message["headers"])
+                content_type = headers.get("content-type", "")
+                if (
+                    "content-encoding" in headers
+                    or not content_type.startswith(COMPRESSIBLE_TYPES)
+                    or (not more_body and len(body) < self.minimum_size)
+                ):
+                    passthrough = True
+                    await send(start_message)
+                    await send(message)
+                    return
+                
+                compressor = _BrotliCompressor() if encoding == "br" else _GzipCompressor()
+                headers["Content-Encoding"] = encoding
+                headers.add_vary_header("Accept-Encoding")
+                # The encoded bytes differ from the identity form, so the
+                # validator they share can only be a weak one
+                etag = headers.get("etag")
+                if etag and not etag.startswith("W/"):
+                    headers["ETag"] = f"W/{etag}"
+                if more_body:
+                    del headers["Content-Length"]
+                    await send(start_message)
+                    await send({"type": "http.response.body", "body": compressor.compress(body), "more_body": True})
+                else:
+                    data = compressor.compress(body) + compressor.flush()
+                    headers["Content-Length"] = str(len(data))
+                    await send(start_message)
+                    await send({"type": "http.response.body", "body": data})
+                return
+            
+            data = compressor.compress(body)
+            if not more_body:
+                data += compressor.flush()
+            await send({"type": "http.response.body", "body": data, "more_body": more_body})
+        
+        await self.app(scope, receive, send_compressed)
+
+
+# Edits to a project within this many seconds of the edit that opened its
+# latest history snapshot update that snapshot instead of adding a new one
+HISTORY_COALESCE_SECONDS = int(os.environ.get('HISTORY_COALESCE_SECONDS', '300'))
 
 
 # Project Routes
@@ -117,22 +662,22 @@ async def create_project(input: ProjectCreate):
     doc = project_obj.model_dump()
     doc['createdAt'] = doc['createdAt'].isoformat()
     
-    await db.projects.insert_one(doc)
+    await storage.insert("projects", doc)
+    await bump_revision("projects")
     return project_obj
 
-@api_router.get("/projects", response_model=List[Project])
-async def get_projects():
-    projects = await db.projects.find({}, {"_id": 0}).to_list(1000)
-    
-    for project in projects:
-        if isinstance(project.get('createdAt'), str):
-            project['createdAt'] = datetime.fromisoformat(project['createdAt'])
+@api_router.get("/projects", response_model=List[Project], dependencies=[Depends(rate_limit("list"))])
+async def get_projects(request: Request):
+    validators = await collection_validators("projects")
+    if is_not_modified(request, validators):
+        return not_modified_response(validators)
     
-    return projects
+    projects = await storage.find("projects", model_fields(Project))
+    return list_response("projects", projects, project_list_serializer, validators)
 
 @api_router.get("/projects/{project_id}", response_model=Project)
 async def get_project(project_id: str):
-    project = await db.projects.find_one({"id": project_id}, {"_id": 0})
+    project = await storage.get("projects", project_id)
     if not project:
         raise HTTPException(status_code=404, detail="Project not found")
     
@@ -149,12 +694,27 @@ async def update_project(project_id: str, input: ProjectUpdate):
         raise HTTPException(status_code=400, detail="No fields to update")
     
     # Get the current project state before updating
-    current_project = await db.projects.find_one({"id": project_id}, {"_id": 0})
+    current_project = await storage.get("projects", project_id)
     
     if not current_project:
         raise HTTPException(status_code=404, detail="Project not found")
     
-    # Save current state to history before updating
+    # Save current state to history before updating, unless an edit earlier in
+    # the coalescing window already saved this window's pre-image
+    if not await coalesce_history(project_id):
+        await save_history(current_project)
+    
+    # Now update the project
+    updated_project = await storage.update("projects", project_id, update_data)
+    await bump_revision("projects", "project_history")
+    await enqueue_notifications(current_project, updated_project)
+    
+    if isinstance(updated_project.get('createdAt'), str):
+        updated_project['createdAt'] = datetime.fromisoformat(updated_project['createdAt'])
+    
+    return updated_project
+
+async def save_history(current_project: dict):
     history_entry = ProjectHistory(
         projectId=current_project['id'],
         projectName=current_project['name'],
@@ -168,45 +728,252 @@ async def update_project(project_id: str, input: ProjectUpdate):
     
     history_doc = history_entry.model_dump()
     history_doc['updatedAt'] = history_doc['updatedAt'].isoformat()
-    await db.project_history.insert_one(history_doc)
+    await storage.insert_history(history_doc)
+
+async def coalesce_history(project_id: str) -> bool:
+    """Fold this edit into the project's pending snapshot if one is still open.
     
-    # Now update the project
-    result = await db.projects.update_one(
-        {"id": project_id},
-        {"$set": update_data}
-    )
+    A snapshot stays open for HISTORY_COALESCE_SECONDS after the edit that
+    created it, and never past the end of its week, so week-over-week history
+    keeps one snapshot per week at least. The snapshot keeps the state from
+    before the window's first edit; only its edit counter moves.
+    """
+    if HISTORY_COALESCE_SECONDS <= 0:
+        return False
     
-    updated_project = await db.projects.find_one({"id": project_id}, {"_id": 0})
-    if isinstance(updated_project.get('createdAt'), str):
-        updated_project['createdAt'] = datetime.fromisoformat(updated_project['createdAt'])
+    now = datetime.now(timezone.utc)
+    week_start = (now - timedelta(days=now.weekday())).replace(hour=0, minute=0, second=0, microsecond=0)
+    window_start = max(now - timedelta(seconds=HISTORY_COALESCE_SECONDS), week_start)
     
-    return updated_project
+    return await storage.coalesce_history(project_id, window_start.isoformat(), now.isoformat())
 
 @api_router.delete("/projects/{project_id}")
 async def delete_project(project_id: str):
-    result = await db.projects.delete_one({"id": project_id})
-    
-    if result.deleted_count == 0:
+    if not await storage.delete("projects", project_id):
         raise HTTPException(status_code=404, detail="Project not found")
     
     # Also delete project history
-    await db.project_history.delete_many({"projectId": project_id})
+    await storage.delete_history(project_id)
+    await storage.delete_archive(project_id)
+    await storage.drop_diff_pages([project_id])
+    await bump_revision("projects", "project_history")
     
     return {"message": "Project deleted successfully"}
 
-@api_router.get("/projects/{project_id}/history", response_model=List[ProjectHistory])
-async def get_project_history(project_id: str):
+@api_router.get("/projects/{project_id}/history", response_model=List[ProjectHistory], dependencies=[Depends(rate_limit("list"))])
+async def get_project_history(project_id: str, request: Request):
     """Get the update history for a specific project"""
-    history = await db.project_history.find(
-        {"projectId": project_id}, 
-        {"_id": 0}
-    ).sort("updatedAt", -1).to_list(1000)
+    validators = await collection_validators("project_history", variant=project_id)
+    if is_not_modified(request, validators):
+        return not_modified_response(validators)
+    
+    history = await storage.list_history(project_id, model_fields(ProjectHistory), 1000)
     
-    for entry in history:
-        if isinstance(entry.get('updatedAt'), str):
-            entry['updatedAt'] = datetime.fromisoformat(entry['updatedAt'])
+    # Older snapshots continue in the archive tier
+    if len(history) < 1000:
+        archived = await archived_history(project_id)
+        history.extend(reversed(archived[-(1000 - len(history)):]))
     
-    return history
+    return list_response("history", history, history_list_serializer, validators)
+
+
+# History tiering
+# Snapshots older than HISTORY_HOT_DAYS are moved out of project_history into
+# project_history_archive, one zlib-compressed segment per project and ISO
+# year. Only weekly keyframes are kept there: the first snapshot of each week,
+# which is the project's state at the end of the week before. Reads merge the
+# two tiers, so callers never see the split.
+HISTORY_HOT_DAYS = int(os.environ.get('HISTORY_HOT_DAYS', '90'))
+HISTORY_COMPACTION_INTERVAL = int(os.environ.get('HISTORY_COMPACTION_INTERVAL', '3600'))
+
+
+def pack_snapshots(snapshots: List[dict]) -> bytes:
+    return zlib.compress(orjson.dumps(snapshots), 6)
+
+
+def unpack_snapshots(payload: bytes) -> List[dict]:
+    return orjson.loads(zlib.decompress(payload))
+
+
+def weekly_keyframes(snapshots: List[dict]) -> List[dict]:
+    """First snapshot of every ISO week, oldest first"""
+    keyframes = {}
+    for snapshot in sorted(snapshots, key=lambda item: item["updatedAt"]):
+        week = iso_week_key(datetime.fromisoformat(snapshot["updatedAt"]))
+        keyframes.setdefault(week, snapshot)
+    return list(keyframes.values())
+
+
+async def archived_history(project_id: str, since: Optional[str] = None) -> List[dict]:
+    """Archived snapshots of a project, oldest first"""
+    segments = await storage.archive_segments(project_ids=[project_id])
+    snapshots = [snapshot for segment in segments for snapshot in unpack_snapshots(segment["payload"])]
+    if since:
+        snapshots = [snapshot for snapshot in snapshots if snapshot["updatedAt"] >= since]
+    return snapshots
+
+
+async def compact_project_history(project_id: str, cutoff: str) -> int:
+    aged = await storage.history_before(project_id, cutoff)
+    if not aged:
+        return 0
+    
+    by_year = {}
+    for snapshot in aged:
+        year = datetime.fromisoformat(snapshot["updatedAt"]).isocalendar()[0]
+        by_year.setdefault(year, []).append(snapshot)
+    
+    # Merging into the existing segment makes a re-run after a crash harmless
+    for year, snapshots in by_year.items():
+        segment_id = f"{project_id}|{year}"
+        existing = await storage.get_archive_segment(segment_id)
+        if existing:
+            snapshots = unpack_snapshots(existing["payload"]) + snapshots
+        unique = {snapshot["id"]: snapshot for snapshot in snapshots}
+        keyframes = weekly_keyframes(list(unique.values()))
+        await storage.put_archive_segment(segment_id, {
+            "projectId": project_id,
+            "year": year,
+            "from": keyframes[0]["updatedAt"],
+            "to": keyframes[-1]["updatedAt"],
+            "count": len(keyframes),
+            "payload": pack_snapshots(keyframes)
+        })
+    
+    await storage.delete_history(project_id, before=cutoff)
+    return len(aged)
+
+
+async def compact_history() -> int:
+    """Move aged snapshots of every project into the archive tier"""
+    cutoff = (datetime.now(timezone.utc) - timedelta(days=HISTORY_HOT_DAYS)).isoformat()
+    project_ids = await storage.projects_with_history_before(cutoff)
+    
+    moved = 0
+    for project_id in project_ids:
+        moved += await compact_project_history(project_id, cutoff)
+    
+    if project_ids:
+        await storage.drop_diff_pages(project_ids)
+        await bump_revision("project_history")
+        logger.info("Archived %d history snapshots from %d projects", moved, len(project_ids))
+    return moved
+
+
+async def iter_history(project_id: str, after: Optional[str], fields: tuple, hot_limit: int):
+    """Snapshots of a project across both tiers, oldest first"""
+    for snapshot in await archived_history(project_id, since=after):
+        yield snapshot
+    
+    async for snapshot in storage.iter_history(project_id, after, fields, hot_limit):
+        yield snapshot
+
+
+# History diffs
+# Consecutive snapshots are compared in one ascending pass over the history
+# cursor. Pages that end before the newest snapshot can no longer change, so
+# they are cached in storage (shared by all workers) until the project's
+# history is rewritten.
+HISTORY_DIFF_TEXT_FIELDS = ("completedThisWeek", "risks", "escalation", "plannedNextWeek")
+HISTORY_DIFF_CACHE_DAYS = int(os.environ.get('HISTORY_DIFF_CACHE_DAYS', '7'))
+HISTORY_DIFF_FIELDS = ("id", "projectName", "status", "bugs", "updatedAt", *HISTORY_DIFF_TEXT_FIELDS)
+
+
+def text_diff(before: str, after: str) -> List[str]:
+    """Changed lines only, prefixed with - or +"""
+    lines = difflib.unified_diff(before.splitlines(), after.splitlines(), lineterm="", n=0)
+    return [line for line in lines if line[:1] in "+-" and not line.startswith(("---", "+++"))]
+
+
+def snapshot_diff(before: dict, after: dict) -> dict:
+    changes = {}
+    if before.get("projectName") != after.get("projectName"):
+        changes["name"] = {"from": before.get("projectName"), "to": after.get("projectName")}
+    if before.get("status") != after.get("status"):
+        changes["status"] = {"from": before.get("status"), "to": after.get("status")}
+    
+    before_bugs = before.get("bugs") or {}
+    after_bugs = after.get("bugs") or {}
+    bugs = {}
+    for severity in BUG_FIELDS:
+        old, new = before_bugs.get(severity, 0), after_bugs.get(severity, 0)
+        if old != new:
+            bugs[severity] = {"from": old, "to": new, "delta": new - old}
+    if bugs:
+        changes["bugs"] = bugs
+    
+    for field in HISTORY_DIFF_TEXT_FIELDS:
+        old, new = before.get(field) or "", after.get(field) or ""
+        if old != new:
+            changes[field] = text_diff(old, new)
+    
+    return {
+        "from": {"id": before.get("id"), "updatedAt": before.get("updatedAt")},
+        "to": {"id": after.get("id"), "updatedAt": after.get("updatedAt")},
+        "changes": changes
+    }
+
+
+@api_router.get("/projects/{project_id}/history/diff", dependencies=[Depends(rate_limit("list"))])
+async def get_project_history_diff(
+    project_id: str,
+    request: Request,
+    after: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=200)
+):
+    """Field-level changes between consecutive history snapshots, oldest first.
+    
+    Pass the returned nextCursor as `after` to read the following page. The
+    last page ends with the change from the newest snapshot to the current
+    project, marked with "current": true.
+    """
+    validators = await collection_validators(
+        "projects", "project_history", variant=f"diff|{project_id}|{after or ''}|{limit}"
+    )
+    if is_not_modified(request, validators):
+        return not_modified_response(validators)
+    
+    cache_key = f"{project_id}|{after or ''}|{limit}"
+    cached = await storage.get_diff_page(cache_key)
+    if cached:
+        return ORJSONResponse(cached, headers=validators)
+    
+    # limit + 1 snapshots give `limit` diffs; one more tells whether the page is closed
+    snapshots = iter_history(project_id, after, HISTORY_DIFF_FIELDS, hot_limit=limit + 2)
+    diffs = []
+    previous = None
+    has_more = False
+    async for snapshot in snapshots:
+        if previous is not None:
+            if len(diffs) == limit:
+                has_more = True
+                break
+            diffs.append(snapshot_diff(previous, snapshot))
+        previous = snapshot
+    
+    page = {
+        "projectId": project_id,
+        "diffs": diffs,
+        "nextCursor": previous["updatedAt"] if has_more else None
+    }
+    
+    if has_more:
+        await storage.put_diff_page(
+            cache_key, project_id, page,
+            datetime.now(timezone.utc) + timedelta(days=HISTORY_DIFF_CACHE_DAYS)
+        )
+        return ORJSONResponse(page, headers=validators)
+    
+    current = await storage.get("projects", project_id)
+    if current is None and previous is None:
+        raise HTTPException(status_code=404, detail="Project not found")
+    if current is not None and previous is not None:
+        current_snapshot = {**current, "projectName": current.get("name"), "updatedAt": None}
+        current_diff = snapshot_diff(previous, current_snapshot)
+        current_diff["to"] = {"id": project_id, "updatedAt": None, "current": True}
+        page["diffs"].append(current_diff)
+    
+    return ORJSONResponse(page, headers=validators)
 
 
 # Calendar Event Routes
@@ -218,315 +985,910 @@ async def create_event(input: CalendarEventCreate):
     doc = event_obj.model_dump()
     doc['createdAt'] = doc['createdAt'].isoformat()
     
-    await db.events.insert_one(doc)
+    await storage.insert("events", doc)
+    await storage.count_events([doc], 1)
+    await bump_revision("events")
     return event_obj
 
-@api_router.get("/events", response_model=List[CalendarEvent])
-async def get_events():
-    events = await db.events.find({}, {"_id": 0}).to_list(1000)
+@api_router.get("/events", response_model=List[CalendarEventWithProject], dependencies=[Depends(rate_limit("list"))])
+async def get_events(request: Request, expand: Optional[str] = None):
+    """List events; expand=project adds each event's project name and status"""
+    if expand not in (None, "", "project"):
+        raise HTTPException(status_code=400, detail="expand only supports 'project'")
     
-    for event in events:
-        if isinstance(event.get('createdAt'), str):
-            event['createdAt'] = datetime.fromisoformat(event['createdAt'])
+    if not expand:
+        validators = await collection_validators("events")
+        if is_not_modified(request, validators):
+            return not_modified_response(validators)
+        events = await storage.find("events", model_fields(CalendarEvent))
+        return list_response("events", events, event_list_serializer, validators)
     
-    return events
+    # The joined view also changes when a linked project is renamed or changes status
+    validators = await collection_validators("events", "projects", variant="expand=project")
+    if is_not_modified(request, validators):
+        return not_modified_response(validators)
+    events = await storage.find_events_with_project(model_fields(CalendarEvent), model_fields(ProjectSummary))
+    return list_response("events", events, expanded_event_list_serializer, validators)
 
 @api_router.delete("/events/{event_id}")
 async def delete_event(event_id: str):
-    result = await db.events.delete_one({"id": event_id})
-    
-    if result.deleted_count == 0:
+    deleted = await storage.delete("events", event_id)
+    if not deleted:
         raise HTTPException(status_code=404, detail="Event not found")
     
+    await storage.count_events([deleted], -1)
+    ics_fragments.discard(event_id)
+    await bump_revision("events")
     return {"message": "Event deleted successfully"}
 
-@api_router.post("/export-ppt")
+# Calendar facets
+# Per-day event counters (overall and per category, projectId and color) are
+# kept in event_day_counts and adjusted on every event write, so filters and
+# month/year density views read a few counter rows instead of every event.
+# They are built from the events once, the first time a deployment starts
+# with this code. One worker builds them while the others wait at startup
+# instead of serving: an event written during the build would be lost to the
+# $out on MongoDB, or counted twice on SQLite if the build had already seen it.
+DAY_PATTERN = r"^\d{4}-\d{2}-\d{2}$"
+EVENT_COUNTS_LEASE_SECONDS = 600
+
+
+async def ensure_event_counts():
+    waiting = False
+    while "event_day_counts" not in await storage.get_revisions(["event_day_counts"]):
+        # A worker that dies mid-build lets its lease expire and a waiting one takes over
+        if await acquire_lease("event_counts_rebuild", EVENT_COUNTS_LEASE_SECONDS):
+            started = time.perf_counter()
+            await storage.rebuild_event_counts()
+            await bump_revision("event_day_counts", "events")
+            logger.info("Built per-day event counters in %.0f ms", (time.perf_counter() - started) * 1000)
+            return
+        if not waiting:
+            logger.info("Waiting for another worker to build the per-day event counters")
+            waiting = True
+        await asyncio.sleep(1)
+
+
+@api_router.get("/events/facets", dependencies=[Depends(rate_limit("list"))])
+async def get_event_facets(
+    request: Request,
+    start: Optional[str] = Query(None, pattern=DAY_PATTERN),
+    end: Optional[str] = Query(None, pattern=DAY_PATTERN)
+):
+    """Event counts per category, projectId and color between two days (inclusive)"""
+    validators = await collection_validators("events", variant=f"facets|{start or ''}|{end or ''}")
+    if is_not_modified(request, validators):
+        return not_modified_response(validators)
+    
+    facets = await storage.event_facets(start, end)
+    return ORJSONResponse({
+        "start": start,
+        "end": end,
+        "total": sum(facets["category"].values()),
+        "categories": facets["category"],
+        "projects": facets["projectId"],
+        "colors": facets["color"]
+    }, headers=validators)
+
+@api_router.get("/events/heatmap", dependencies=[Depends(rate_limit("list"))])
+async def get_event_heatmap(
+    request: Request,
+    month: Optional[str] = Query(None, pattern=r"^\d{4}-\d{2}$"),
+    year: Optional[int] = Query(None, ge=1, le=9999)
+):
+    """Events per day for a month (YYYY-MM) or a year; days without events are omitted"""
+    if (month is None) == (year is None):
+        raise HTTPException(status_code=400, detail="Pass either month or year")
+    period = month or f"{year:04d}"
+    
+    validators = await collection_validators("events", variant=f"heatmap|{period}")
+    if is_not_modified(request, validators):
+        return not_modified_response(validators)
+    
+    # Bounds that sort before and after every YYYY-MM-DD inside the period
+    days = await storage.event_day_totals(f"{period}-00", f"{period}-99")
+    return ORJSONResponse({
+        "period": period,
+        "days": days,
+        "max": max(days.values(), default=0)
+    }, headers=validators)
+
+# iCalendar feed
+# Each event's VEVENT block is cached per worker, keyed by the event id and
+# invalidated when any of the fields it is built from change. Clients get an
+# ETag derived from the events revision, so polling an unchanged calendar is a
+# single revision lookup.
+ICS_CACHE_SIZE = int(os.environ.get('ICS_CACHE_SIZE', '10000'))
+ICS_FIELDS = ("id", "date", "startTime", "endTime", "title", "description", "category", "projectId", "createdAt")
+
+
+def ics_escape(text: str) -> str:
+    return (
+        text.replace("\\", "\\\\")
+        .replace(";", "\\;")
+        .replace(",", "\\,")
+        .replace("\r\n", "\\n")
+        .replace("\n", "\\n")
+    )
+
+
+def ics_fold(line: str) -> str:
+    """Fold a content line at 75 octets as RFC 5545 requires"""
+    encoded = line.encode("utf-8")
+    if len(encoded) <= 75:
+        return line + "\r\n"
+    parts = []
+    limit = 75
+    while len(encoded) > limit:
+        # Never split a multi-byte UTF-8 sequence
+        cut = limit
+        while cut > 0 and (encoded[cut] & 0xC0) == 0x80:
+            cut -= 1
+        parts.append(encoded[:cut].decode("utf-8"))
+        encoded = encoded[cut:]
+        # Continuation lines start with a space
+        limit = 74
+    parts.append(encoded.decode("utf-8"))
+    return "\r\n ".join(parts) + "\r\n"
+
+
+def ics_datetime(day: str, clock: str) -> str:
+    return f"{day.replace('-', '')}T{clock.replace(':', '')[:4]}00"
+
+
+def build_vevent(event: dict) -> bytes:
+    created_at = event.get("createdAt")
+    if isinstance(created_at, str):
+        created_at = datetime.fromisoformat(created_at)
+    stamp = (created_at or datetime.now(timezone.utc)).astimezone(timezone.utc)
+    
+    lines = [
+        "BEGIN:VEVENT",
+        f"UID:{event['id']}@programpulse",
+        f"DTSTAMP:{stamp.strftime('%Y%m%dT%H%M%SZ')}",
+        f"DTSTART:{ics_datetime(event['date'], event.get('startTime') or '09:00')}",
+        f"DTEND:{ics_datetime(event['date'], event.get('endTime') or '10:00')}",
+        f"SUMMARY:{ics_escape(event.get('title', ''))}",
+    ]
+    if event.get("description"):
+        lines.append(f"DESCRIPTION:{ics_escape(event['description'])}")
+    if event.get("category"):
+        lines.append(f"CATEGORIES:{ics_escape(event['category'])}")
+    lines.append("END:VEVENT")
+    return "".join(ics_fold(line) for line in lines).encode("utf-8")
+
+
+class FragmentCache:
+    """Bounded LRU of rendered fragments keyed by id and a fingerprint"""
+    
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+    
+    def get(self, key: str, fingerprint, build, source) -> bytes:
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] == fingerprint:
+            self._entries.move_to_end(key)
+            return entry[1]
+        fragment = build(source)
+        self._entries[key] = (fingerprint, fragment)
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+        return fragment
+    
+    def discard(self, key: str):
+        self._entries.pop(key, None)
+
+
+ics_fragments = FragmentCache(ICS_CACHE_SIZE)
+
+ICS_HEADER = (
+    "BEGIN:VCALENDAR\r\n"
+    "VERSION:2.0\r\n"
+    "PRODID:-//LucyRx//Program Pulse//EN\r\n"
+    "CALSCALE:GREGORIAN\r\n"
+    "METHOD:PUBLISH\r\n"
+    "X-WR-CALNAME:Program Pulse\r\n"
+    "REFRESH-INTERVAL;VALUE=DURATION:PT15M\r\n"
+    "X-PUBLISHED-TTL:PT15M\r\n"
+).encode("utf-8")
+ICS_FOOTER = b"END:VCALENDAR\r\n"
+
+
+async def stream_ics(category: Optional[str], project_id: Optional[str]):
+    yield ICS_HEADER
+    batch = []
+    async for event in storage.iter_events(ICS_FIELDS, category=category, project_id=project_id):
+        fingerprint = tuple(event.get(field) for field in ICS_FIELDS)
+        batch.append(ics_fragments.get(event["id"], fingerprint, build_vevent, event))
+        if len(batch) >= 200:
+            yield b"".join(batch)
+            batch = []
+    if batch:
+        yield b"".join(batch)
+    yield ICS_FOOTER
+
+
+@api_router.get("/events.ics", dependencies=[Depends(rate_limit("list"))])
+async def get_events_ics(request: Request, category: Optional[str] = None, projectId: Optional[str] = None):
+    """Subscribable iCalendar feed of calendar events"""
+    validators = await collection_validators("events", variant=f"ics|{category or ''}|{projectId or ''}")
+    if is_not_modified(request, validators):
+        return not_modified_response(validators)
+    
+    return StreamingResponse(
+        stream_ics(category, projectId),
+        media_type="text/calendar; charset=utf-8",
+        headers={**validators, "Content-Disposition": 'inline; filename="program_pulse.ics"'}
+    )
+
+# The PowerPoint renderer pulls in python-pptx, lxml, PIL and XlsxWriter, which
+# most requests never need. deck.py is imported on the first export, or shortly
+# after startup by prewarm_exports() once the worker is already serving.
+PREWARM_EXPORTS = os.environ.get('PREWARM_EXPORTS', 'true').lower() in ('1', 'true', 'yes')
+PREWARM_DELAY_SECONDS = float(os.environ.get('PREWARM_DELAY_SECONDS', '5'))
+
+
+def load_deck():
+    import deck
+    return deck
+
+
+async def prewarm_exports():
+    await asyncio.sleep(PREWARM_DELAY_SECONDS)
+    started = time.perf_counter()
+    await run_in_threadpool(load_deck)
+    logger.info("Pre-warmed export renderer in %.0f ms", (time.perf_counter() - started) * 1000)
+
+def admit_export():
+    """Shed load instead of queueing once this worker is busy rendering"""
+    if inflight_exports.count >= EXPORT_CONCURRENCY:
+        raise HTTPException(
+            status_code=429,
+            detail="Too many exports in progress",
+            headers={"Retry-After": str(EXPORT_RETRY_AFTER)}
+        )
+
+@api_router.post("/export-ppt", dependencies=[Depends(rate_limit("export"))])
 async def export_projects_ppt(projects: List[Project]):
     """Generate PowerPoint presentation from projects"""
+    export_date = datetime.now().strftime("%Y-%m-%d")
+    admit_export()
     try:
-        # Create presentation
-        prs = Presentation()
-        prs.slide_width = Inches(10)
-        prs.slide_height = Inches(7.5)
-        
-        # Define colors (LucyRx theme)
-        PURPLE = RGBColor(74, 65, 115)  # #4A4173
-        LIGHT_PURPLE = RGBColor(107, 91, 149)  # #6B5B95
-        CREAM = RGBColor(255, 249, 230)  # #FFF9E6
-        WHITE = RGBColor(255, 255, 255)
-        
-        # Status colors
-        STATUS_COLORS = {
-            'On Track': RGBColor(16, 185, 129),
-            'At Risk': RGBColor(245, 158, 11),
-            'Delayed': RGBColor(239, 68, 68),
-            'Completed': RGBColor(99, 102, 241)
-        }
-        
-        # Title Slide
-        title_slide_layout = prs.slide_layouts[6]  # Blank layout
-        title_slide = prs.slides.add_slide(title_slide_layout)
-        
-        # Background for title slide
-        background = title_slide.background
-        fill = background.fill
-        fill.solid()
-        fill.fore_color.rgb = PURPLE
-        
-        # Add logo
-        logo_path = Path(__file__).parent / 'lucy_logo.png'
-        if logo_path.exists():
-            title_slide.shapes.add_picture(
-                str(logo_path),
-                Inches(4),
-                Inches(1.5),
-                width=Inches(2)
-            )
-        
-        # Title
-        title_box = title_slide.shapes.add_textbox(
-            Inches(0.5), Inches(3.5), Inches(9), Inches(1)
-        )
-        title_frame = title_box.text_frame
-        title_frame.text = 'Program Pulse'
-        title_para = title_frame.paragraphs[0]
-        title_para.font.size = Pt(48)
-        title_para.font.bold = True
-        title_para.font.color.rgb = WHITE
-        title_para.alignment = PP_ALIGN.CENTER
+        async with inflight_exports.track():
+            deck_path = await run_in_threadpool(lambda: load_deck().render_projects_deck(projects))
         
-        # Subtitle
-        subtitle_box = title_slide.shapes.add_textbox(
-            Inches(0.5), Inches(4.5), Inches(9), Inches(0.5)
+        # Return file
+        filename = f'program_pulse_projects_{export_date}.pptx'
+        return FileResponse(
+            deck_path,
+            media_type='application/vnd.openxmlformats-officedocument.presentationml.presentation',
+            filename=filename,
+            background=BackgroundTask(os.remove, deck_path)
         )
-        subtitle_frame = subtitle_box.text_frame
-        subtitle_frame.text = 'keeping a pulse on all LucyRx initiatives'
-        subtitle_para = subtitle_frame.paragraphs[0]
-        subtitle_para.font.size = Pt(18)
-        subtitle_para.font.italic = True
-        subtitle_para.font.color.rgb = WHITE
-        subtitle_para.alignment = PP_ALIGN.CENTER
+    
+    except Exception as e:
+        logging.error(f"Error generating PPT: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to generate PowerPoint: {str(e)}")
+
+
+
+# Period export
+async def weekly_openings(since: str, project_ids: Optional[List[str]]) -> dict:
+    """Earliest history snapshot per project and ISO week, read in one query.
+    
+    History rows are pre-images, so the first row of a week is the state the
+    project was in when that week's first edit happened, i.e. its state at
+    the end of the previous week.
+    """
+    openings = await storage.week_openings(since, project_ids)
+    
+    # Periods reaching past the hot tier also read the archived keyframes. A
+    # week split across both tiers opens with its archived (earlier) snapshot.
+    hot_cutoff = (datetime.now(timezone.utc) - timedelta(days=HISTORY_HOT_DAYS)).isoformat()
+    if since < hot_cutoff:
+        for segment in await storage.archive_segments(project_ids=project_ids, ending_after=since):
+            for snapshot in unpack_snapshots(segment["payload"]):
+                if snapshot["updatedAt"] < since:
+                    continue
+                key = (segment["projectId"], iso_week_key(datetime.fromisoformat(snapshot["updatedAt"])))
+                openings[key] = {"status": snapshot.get("status"), "bugs": snapshot.get("bugs")}
+    return openings
+
+
+def build_period_series(projects: List[dict], openings: dict, week_starts: List[datetime]) -> List[dict]:
+    """Work out each project's end-of-week state for every week in the period"""
+    series = []
+    for project in projects:
+        created_at = project.get("createdAt")
+        if isinstance(created_at, str):
+            created_at = datetime.fromisoformat(created_at)
         
-        # Date and project count
-        date_text = datetime.now().strftime('%B %d, %Y')
-        info_box = title_slide.shapes.add_textbox(
-            Inches(0.5), Inches(5.5), Inches(9), Inches(0.5)
-        )
-        info_frame = info_box.text_frame
-        info_frame.text = f'{date_text}\n{len(projects)} Active Project{"s" if len(projects) != 1 else ""}'
-        for para in info_frame.paragraphs:
-            para.font.size = Pt(14)
-            para.font.color.rgb = WHITE
-            para.alignment = PP_ALIGN.CENTER
+        # Walk backwards from the current state, rewinding at each week's opening snapshot
+        state = {"status": project.get("status"), "bugs": project.get("bugs") or {}}
+        weeks = []
+        for week_start in reversed(week_starts):
+            week_end = week_start + timedelta(days=7)
+            existed = created_at is None or created_at < week_end
+            weeks.append({
+                "label": f"W{week_start.isocalendar()[1]:02d}",
+                "status": state["status"] if existed else None,
+                "bugs": dict(state["bugs"]) if existed else {}
+            })
+            opening = openings.get((project["id"], iso_week_key(week_start)))
+            if opening:
+                state = {"status": opening.get("status"), "bugs": opening.get("bugs") or {}}
+        weeks.reverse()
         
-        # Create slides for each project
-        for idx, project in enumerate(projects):
-            # Use blank layout
-            slide_layout = prs.slide_layouts[6]
-            slide = prs.slides.add_slide(slide_layout)
-            
-            # Background
-            background = slide.background
-            fill = background.fill
-            fill.solid()
-            fill.fore_color.rgb = CREAM
-            
-            # Header bar
-            header_shape = slide.shapes.add_shape(
-                1,  # Rectangle
-                Inches(0), Inches(0),
-                Inches(10), Inches(0.6)
-            )
-            header_shape.fill.solid()
-            header_shape.fill.fore_color.rgb = PURPLE
-            header_shape.line.fill.background()
-            
-            # Add logo to header
-            if logo_path.exists():
-                slide.shapes.add_picture(
-                    str(logo_path),
-                    Inches(0.2),
-                    Inches(0.15),
-                    height=Inches(0.3)
-                )
-            
-            # Project number
-            header_text = header_shape.text_frame
-            header_text.text = f'Project {idx + 1} of {len(projects)}'
-            header_text.paragraphs[0].font.size = Pt(14)
-            header_text.paragraphs[0].font.color.rgb = WHITE
-            header_text.paragraphs[0].alignment = PP_ALIGN.RIGHT
-            header_text.margin_right = Inches(0.3)
-            
-            # Project name
-            name_box = slide.shapes.add_textbox(
-                Inches(0.5), Inches(1), Inches(9), Inches(0.7)
-            )
-            name_frame = name_box.text_frame
-            name_frame.text = project.name or 'Unnamed Project'
-            name_para = name_frame.paragraphs[0]
-            name_para.font.size = Pt(32)
-            name_para.font.bold = True
-            name_para.font.color.rgb = PURPLE
-            
-            # Status badge
-            status_color = STATUS_COLORS.get(project.status, STATUS_COLORS['On Track'])
-            status_shape = slide.shapes.add_shape(
-                1,  # Rectangle
-                Inches(0.5), Inches(1.8),
-                Inches(1.5), Inches(0.4)
-            )
-            status_shape.fill.solid()
-            status_shape.fill.fore_color.rgb = status_color
-            status_shape.line.fill.background()
-            
-            status_text = status_shape.text_frame
-            status_text.text = project.status or 'On Track'
-            status_para = status_text.paragraphs[0]
-            status_para.font.size = Pt(14)
-            status_para.font.bold = True
-            status_para.font.color.rgb = WHITE
-            status_para.alignment = PP_ALIGN.CENTER
-            
-            y_pos = 2.4
-            
-            # Helper function to add section
-            def add_section(title, content, y):
-                if not content or content == 'None' or content == 'NA':
-                    return y
-                
-                # Section box
-                section_shape = slide.shapes.add_shape(
-                    1,  # Rectangle
-                    Inches(0.5), Inches(y),
-                    Inches(9), Inches(0.8)
-                )
-                section_shape.fill.solid()
-                section_shape.fill.fore_color.rgb = RGBColor(245, 240, 255)
-                section_shape.line.fill.background()
-                
-                # Section text
-                text_frame = section_shape.text_frame
-                text_frame.margin_top = Inches(0.1)
-                text_frame.margin_left = Inches(0.2)
-                text_frame.margin_right = Inches(0.2)
-                
-                # Title
-                p = text_frame.paragraphs[0]
-                p.text = title
-                p.font.size = Pt(11)
-                p.font.bold = True
-                p.font.color.rgb = LIGHT_PURPLE
-                
-                # Content
-                p = text_frame.add_paragraph()
-                p.text = content
-                p.font.size = Pt(12)
-                p.font.color.rgb = PURPLE
-                p.space_before = Pt(2)
-                
-                return y + 0.9
-            
-            # Add sections
-            if project.completedThisWeek:
-                y_pos = add_section('COMPLETED THIS WEEK', project.completedThisWeek, y_pos)
-            
-            if project.risks and project.risks != 'None' and project.risks != 'NA':
-                y_pos = add_section('RISKS', project.risks, y_pos)
-            
-            if project.escalation and project.escalation != 'None':
-                y_pos = add_section('ESCALATION', project.escalation, y_pos)
-            
-            if project.plannedNextWeek:
-                y_pos = add_section('PLANNED NEXT WEEK', project.plannedNextWeek, y_pos)
-            
-            # Bug severity matrix
-            bugs = project.bugs
-            total_bugs = bugs.critical + bugs.high + bugs.medium + bugs.low
-            
-            if total_bugs > 0 and y_pos < 6.5:
-                # Title
-                bug_title = slide.shapes.add_textbox(
-                    Inches(0.5), Inches(y_pos), Inches(9), Inches(0.3)
-                )
-                bug_title_frame = bug_title.text_frame
-                bug_title_frame.text = f'BUG SEVERITY MATRIX (Total: {total_bugs})'
-                bug_title_frame.paragraphs[0].font.size = Pt(11)
-                bug_title_frame.paragraphs[0].font.bold = True
-                bug_title_frame.paragraphs[0].font.color.rgb = LIGHT_PURPLE
-                
-                y_pos += 0.35
-                
-                # Bug cards
-                bug_data = [
-                    ('CRITICAL', bugs.critical, RGBColor(220, 38, 38)),
-                    ('HIGH', bugs.high, RGBColor(245, 158, 11)),
-                    ('MEDIUM', bugs.medium, RGBColor(59, 130, 246)),
-                    ('LOW', bugs.low, RGBColor(16, 185, 129))
-                ]
-                
-                x_pos = 0.5
-                for label, count, color in bug_data:
-                    card = slide.shapes.add_shape(
-                        1,  # Rectangle
-                        Inches(x_pos), Inches(y_pos),
-                        Inches(2), Inches(0.6)
-                    )
-                    card.fill.solid()
-                    card.fill.fore_color.rgb = color
-                    card.line.fill.background()
-                    
-                    card_text = card.text_frame
-                    card_text.vertical_anchor = 1  # Middle
-                    
-                    # Label
-                    p = card_text.paragraphs[0]
-                    p.text = label
-                    p.font.size = Pt(10)
-                    p.font.bold = True
-                    p.font.color.rgb = WHITE
-                    p.alignment = PP_ALIGN.CENTER
-                    
-                    # Count
-                    p = card_text.add_paragraph()
-                    p.text = str(count)
-                    p.font.size = Pt(16)
-                    p.font.bold = True
-                    p.font.color.rgb = WHITE
-                    p.alignment = PP_ALIGN.CENTER
-                    
-                    x_pos += 2.2
-            
-            # Footer
-            footer = slide.shapes.add_textbox(
-                Inches(0.5), Inches(7), Inches(9), Inches(0.3)
+        series.append({
+            "name": project.get("name"),
+            "status": project.get("status"),
+            "weeks": weeks
+        })
+    return series
+
+
+@api_router.get("/export-ppt/period", dependencies=[Depends(rate_limit("export"))])
+async def export_period_ppt(
+    request: Request,
+    weeks: int = Query(13, ge=1, le=104),
+    projectIds: Optional[str] = None
+):
+    """Generate a trend deck covering the last N weeks of project history"""
+    project_ids = [pid.strip() for pid in projectIds.split(",") if pid.strip()] if projectIds else None
+    
+    now = datetime.now(timezone.utc)
+    this_week = (now - timedelta(days=now.weekday())).replace(hour=0, minute=0, second=0, microsecond=0)
+    week_starts = [this_week - timedelta(weeks=n) for n in range(weeks - 1, -1, -1)]
+    
+    validators = await collection_validators(
+        "projects", "project_history",
+        variant=f"{weeks}|{','.join(project_ids or [])}|{now.date().isoformat()}"
+    )
+    if is_not_modified(request, validators):
+        return not_modified_response(validators)
+    
+    # Take the export slot before the first await, so concurrent requests
+    # see it taken while this one is still reading
+    admit_export()
+    try:
+        async with inflight_exports.track():
+            projects = await storage.find(
+                "projects", ("id", "name", "status", "bugs", "createdAt"), ids=project_ids
             )
-            footer_frame = footer.text_frame
-            footer_frame.text = 'Generated by Program Pulse'
-            footer_para = footer_frame.paragraphs[0]
-            footer_para.font.size = Pt(10)
-            footer_para.font.italic = True
-            footer_para.font.color.rgb = LIGHT_PURPLE
-            footer_para.alignment = PP_ALIGN.CENTER
+            openings = await weekly_openings(week_starts[0].isoformat(), project_ids)
+            series = build_period_series(projects, openings, week_starts)
+            period_label = f"{week_starts[0].strftime('%b %d, %Y')} – {now.strftime('%b %d, %Y')}"
+            deck_path = await run_in_threadpool(lambda: load_deck().render_period_deck(series, period_label))
         
-        # Save to temporary file
-        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.pptx')
-        prs.save(temp_file.name)
-        temp_file.close()
-        
-        # Return file
-        filename = f'program_pulse_projects_{datetime.now().strftime("%Y-%m-%d")}.pptx'
+        filename = f'program_pulse_{weeks}_weeks_{now.strftime("%Y-%m-%d")}.pptx'
         return FileResponse(
-            temp_file.name,
+            deck_path,
             media_type='application/vnd.openxmlformats-officedocument.presentationml.presentation',
-            filename=filename
+            filename=filename,
+            headers=validators,
+            background=BackgroundTask(os.remove, deck_path)
         )
     
     except Exception as e:
-        logging.error(f"Error generating PPT: {str(e)}")
+        logging.error(f"Error generating period PPT: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to generate PowerPoint: {str(e)}")
 
 
+# Weekly snapshots
+# Once a week is over, close_week() freezes every project's end-of-week state
+# into weekly_snapshots, together with aggregate stats and the rendered status
+# deck. A closed week never changes, so it is served with an immutable
+# Cache-Control and its export is a stored file rather than a fresh render.
+# The job runs every WEEKLY_SNAPSHOT_INTERVAL seconds and closes every week
+# that ended since the newest snapshot. End-of-week states come from the
+# current projects rewound by their first history snapshot after the week
+# ended, so weeks missed while the job was down are backfilled only while
+# that history is still in the hot tier (HISTORY_HOT_DAYS); older ones are
+# skipped with a warning. A fresh deployment starts with the last week.
+WEEKLY_SNAPSHOT_INTERVAL = int(os.environ.get('WEEKLY_SNAPSHOT_INTERVAL', '3600'))
+WEEKLY_SNAPSHOT_CACHE_CONTROL = "public, max-age=31536000, immutable"
+WEEKLY_SNAPSHOT_SUMMARY_FIELDS = ("week", "weekStart", "weekEnd", "closedAt", "stats")
+SNAPSHOT_STATE_FIELDS = ("status", "completedThisWeek", "risks", "escalation", "plannedNextWeek", "bugs")
+PPTX_MEDIA_TYPE = 'application/vnd.openxmlformats-officedocument.presentationml.presentation'
+
+
+def end_of_week_states(projects: List[dict], openings: dict, week_end: datetime) -> List[dict]:
+    """Rewind current projects to their state when the week ended"""
+    states = []
+    for project in projects:
+        created_at = project.get("createdAt")
+        if isinstance(created_at, str):
+            created_at = datetime.fromisoformat(created_at)
+        if created_at is not None and created_at >= week_end:
+            continue
+        
+        state = dict(project)
+        opening = openings.get(project["id"])
+        if opening:
+            # History rows are pre-images: the first one after the week ended
+            # holds the state the project ended the week in
+            state["name"] = opening.get("projectName", state["name"])
+            state.update({field: opening[field] for field in SNAPSHOT_STATE_FIELDS if field in opening})
+        states.append(state)
+    return states
+
+
+def weekly_stats(projects: List[dict]) -> dict:
+    by_status = {}
+    bugs = dict.fromkeys(BUG_FIELDS, 0)
+    escalations = 0
+    for project in projects:
+        by_status[project["status"]] = by_status.get(project["status"], 0) + 1
+        for severity in BUG_FIELDS:
+            bugs[severity] += (project.get("bugs") or {}).get(severity, 0)
+        if project.get("escalation") and project["escalation"] != "None":
+            escalations += 1
+    return {"projects": len(projects), "byStatus": by_status, "bugs": bugs, "escalations": escalations}
+
+
+async def render_weekly_deck(snapshot: dict) -> dict:
+    """Render a snapshot's status deck and return it as a stored artifact"""
+    projects = [Project(**project) for project in snapshot["projects"]]
+    week_end = datetime.fromisoformat(snapshot["weekEnd"]) - timedelta(days=1)
+    date_text = f"Week {snapshot['week']} (ending {week_end.strftime('%B %d, %Y')})"
+    
+    def render() -> bytes:
+        deck_path = load_deck().render_projects_deck(projects, date_text=date_text)
+        try:
+            return Path(deck_path).read_bytes()
+        finally:
+            os.remove(deck_path)
+    
+    async with inflight_exports.track():
+        data = await run_in_threadpool(render)
+    return {
+        "filename": f"program_pulse_{snapshot['week']}.pptx",
+        "contentType": PPTX_MEDIA_TYPE,
+        "etag": hashlib.sha1(data).hexdigest()[:20],
+        "data": data
+    }
+
+
+async def snapshot_week(week_end: datetime, now: datetime) -> Optional[str]:
+    """Freeze the week ending at week_end unless it has already been closed"""
+    week_start = week_end - timedelta(weeks=1)
+    week = iso_week_key(week_start)
+    if await storage.get_weekly_snapshot(week, fields=("week",)):
+        return None
+    
+    projects = await storage.find("projects", model_fields(Project))
+    openings = await storage.earliest_history(week_end.isoformat())
+    states = end_of_week_states(projects, openings, week_end)
+    snapshot = {
+        "week": week,
+        "weekStart": week_start.isoformat(),
+        "weekEnd": week_end.isoformat(),
+        "closedAt": now.isoformat(),
+        "stats": weekly_stats(states),
+        "projects": states
+    }
+    
+    if not await storage.insert_weekly_snapshot(snapshot, await render_weekly_deck(snapshot)):
+        return None
+    await bump_revision("weekly_snapshots")
+    logger.info("Closed week %s with %d projects", week, len(states))
+    return week
+
+
+async def close_week() -> List[str]:
+    """Snapshot every completed week since the newest closed one"""
+    now = datetime.now(timezone.utc)
+    last_week_end = (now - timedelta(days=now.weekday())).replace(hour=0, minute=0, second=0, microsecond=0)
+    newest = await storage.list_weekly_snapshots(("weekEnd",), 1)
+    week_end = datetime.fromisoformat(newest[0]["weekEnd"]) + timedelta(weeks=1) if newest else last_week_end
+    
+    # A week ending before the hot cutoff may have archived history after it
+    hot_cutoff = now - timedelta(days=HISTORY_HOT_DAYS)
+    skipped = []
+    while week_end <= last_week_end and week_end < hot_cutoff:
+        skipped.append(iso_week_key(week_end - timedelta(weeks=1)))
+        week_end += timedelta(weeks=1)
+    if skipped:
+        logger.warning("Skipped closing %d week(s) up to %s: their history has left the hot tier", len(skipped), skipped[-1])
+    
+    closed = []
+    while week_end <= last_week_end:
+        week = await snapshot_week(week_end, now)
+        if week:
+            closed.append(week)
+        week_end += timedelta(weeks=1)
+    return closed
+
+
+def weekly_snapshot_headers(snapshot: dict) -> dict:
+    etag = hashlib.sha1(f"{snapshot['week']}|{snapshot['closedAt']}".encode()).hexdigest()[:20]
+    return {"ETag": f'"{etag}"', "Cache-Control": WEEKLY_SNAPSHOT_CACHE_CONTROL}
+
+
+@api_router.get("/weekly-snapshots", dependencies=[Depends(rate_limit("list"))])
+async def list_weekly_snapshots(request: Request, limit: int = Query(52, ge=1, le=520)):
+    """Closed weeks with their aggregate stats, newest first"""
+    validators = await collection_validators("weekly_snapshots", variant=str(limit))
+    if is_not_modified(request, validators):
+        return not_modified_response(validators)
+    
+    snapshots = await storage.list_weekly_snapshots(WEEKLY_SNAPSHOT_SUMMARY_FIELDS, limit)
+    return ORJSONResponse(snapshots, headers=validators)
+
+@api_router.get("/weekly-snapshots/{week}", dependencies=[Depends(rate_limit("list"))])
+async def get_weekly_snapshot(week: str, request: Request):
+    """Every project's state at the end of an ISO week (e.g. 2026-W41)"""
+    snapshot = await storage.get_weekly_snapshot(week)
+    if snapshot is None:
+        raise HTTPException(status_code=404, detail="Snapshot not found")
+    
+    headers = weekly_snapshot_headers(snapshot)
+    if is_not_modified(request, headers):
+        return not_modified_response(headers)
+    return ORJSONResponse(snapshot, headers=headers)
+
+@api_router.get("/weekly-snapshots/{week}/export-ppt", dependencies=[Depends(rate_limit("export"))])
+async def export_weekly_snapshot_ppt(week: str, request: Request):
+    """The status deck rendered when the week was closed"""
+    artifact = await storage.get_weekly_artifact(week)
+    if artifact is None:
+        # Only possible if the job stopped between storing the snapshot and its deck
+        snapshot = await storage.get_weekly_snapshot(week)
+        if snapshot is None:
+            raise HTTPException(status_code=404, detail="Snapshot not found")
+        admit_export()
+        artifact = await render_weekly_deck(snapshot)
+        await storage.put_weekly_artifact(week, artifact)
+    
+    headers = {
+        "ETag": f'"{artifact["etag"]}"',
+        "Cache-Control": WEEKLY_SNAPSHOT_CACHE_CONTROL,
+        "Content-Disposition": f'attachment; filename="{artifact["filename"]}"'
+    }
+    if is_not_modified(request, headers):
+        return not_modified_response(headers)
+    return Response(artifact["data"], media_type=artifact["contentType"], headers=headers)
+
+
+# Spreadsheet import
+# Uploads are parsed in chunks of IMPORT_CHUNK_ROWS rows, validated row by row
+# and written with unordered bulk inserts, so memory stays bounded by the
+# chunk size rather than the file size. Blank lines and fully empty rows are
+# skipped but still counted, so reported row numbers match the sheet.
+IMPORT_CHUNK_ROWS = int(os.environ.get('IMPORT_CHUNK_ROWS', '1000'))
+IMPORT_MAX_ERRORS = int(os.environ.get('IMPORT_MAX_ERRORS', '1000'))
+
+
+def read_csv_chunks(file, chunk_rows: int):
+    import pandas as pd
+    
+    # Blank lines are kept (as empty rows) so row numbers stay aligned
+    reader = pd.read_csv(
+        file, chunksize=chunk_rows, dtype=str, keep_default_na=False,
+        skipinitialspace=True, skip_blank_lines=False
+    )
+    for chunk in reader:
+        yield chunk.to_dict(orient="records")
+
+
+def xlsx_cell_text(value) -> str:
+    """Render a typed worksheet cell the way it would appear in a CSV export"""
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    if isinstance(value, datetime):
+        return value.date().isoformat() if value.time() == dt_time(0) else value.isoformat()
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, dt_time):
+        return value.strftime("%H:%M")
+    return str(value)
+
+
+def read_xlsx_chunks(file, chunk_rows: int):
+    from openpyxl import load_workbook
+    
+    workbook = load_workbook(file, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = [str(cell).strip() if cell is not None else "" for cell in next(rows, ())]
+        chunk = []
+        for values in rows:
+            chunk.append({
+                column: xlsx_cell_text(value)
+                for column, value in zip(header, values) if column
+            })
+            if len(chunk) >= chunk_rows:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+    finally:
+        workbook.close()
+
+
+def import_row(row: dict) -> dict:
+    """Drop blank cells so model defaults apply, and nest bug-count columns"""
+    cleaned = {}
+    bugs = {}
+    for column, value in row.items():
+        column = str(column).strip()
+        value = value.strip() if isinstance(value, str) else value
+        if value == "" or value is None:
+            continue
+        field = column.removeprefix("bugs.")
+        if field in BUG_FIELDS:
+            bugs[field] = value
+        else:
+            cleaned[column] = value
+    if bugs:
+        cleaned["bugs"] = bugs
+    return cleaned
+
+
+project_create_list_adapter = TypeAdapter(List[ProjectCreate])
+event_create_list_adapter = TypeAdapter(List[CalendarEventCreate])
+
+
+def validate_import_batch(rows: List[dict], adapter: TypeAdapter):
+    """Validate a chunk in one pass; returns (valid row indexes, documents, errors by index)"""
+    try:
+        items = adapter.validate_python(rows)
+        valid = list(range(len(rows)))
+        errors = {}
+    except ValidationError as e:
+        errors = {}
+        for error in e.errors():
+            index, *loc = error["loc"]
+            errors.setdefault(index, []).append({
+                "field": ".".join(str(part) for part in loc),
+                "message": error["msg"]
+            })
+        valid = [index for index in range(len(rows)) if index not in errors]
+        items = adapter.validate_python([rows[index] for index in valid])
+    
+    # Same shape create_project/create_event store
+    created_at = datetime.now(timezone.utc).isoformat()
+    docs = [
+        {"id": str(uuid.uuid4()), **doc, "createdAt": created_at}
+        for doc in adapter.dump_python(items)
+    ]
+    return valid, docs, errors
+
+
+async def import_spreadsheet(upload: UploadFile, collection: str, adapter: TypeAdapter, on_insert=None) -> dict:
+    filename = (upload.filename or "").lower()
+    if filename.endswith(".csv") or upload.content_type == "text/csv":
+        chunks = read_csv_chunks(upload.file, IMPORT_CHUNK_ROWS)
+    elif filename.endswith(".xlsx"):
+        chunks = read_xlsx_chunks(upload.file, IMPORT_CHUNK_ROWS)
+    else:
+        raise HTTPException(status_code=400, detail="Upload a .csv or .xlsx file")
+    
+    summary = {"rows": 0, "inserted": 0, "failed": 0, "errors": []}
+    
+    def record_error(row_number: int, errors: list):
+        summary["failed"] += 1
+        if len(summary["errors"]) < IMPORT_MAX_ERRORS:
+            summary["errors"].append({"row": row_number, "errors": errors})
+    
+    # Spreadsheet row numbers: the header is row 1
+    row_number = 1
+    try:
+        while True:
+            chunk = await run_in_threadpool(next, chunks, None)
+            if chunk is None:
+                break
+            
+            # Keep each non-empty row's sheet row number alongside it
+            rows, row_numbers = [], []
+            for row in chunk:
+                row_number += 1
+                row = import_row(row)
+                if row:
+                    rows.append(row)
+                    row_numbers.append(row_number)
+            summary["rows"] += len(rows)
+            if not rows:
+                continue
+            
+            valid, docs, errors = validate_import_batch(rows, adapter)
+            for index, row_errors in errors.items():
+                record_error(row_numbers[index], row_errors)
+            doc_rows = [row_numbers[index] for index in valid]
+            
+            if not docs:
+                continue
+            inserted, write_errors = await storage.insert_many(collection, docs)
+            summary["inserted"] += inserted
+            for index, message in write_errors:
+                record_error(doc_rows[index], [{"field": "", "message": message}])
+            if on_insert is not None and inserted:
+                failed = {index for index, _ in write_errors}
+                await on_insert([doc for index, doc in enumerate(docs) if index not in failed])
+    except (ValueError, KeyError, zipfile.BadZipFile) as e:
+        # Malformed file (bad CSV quoting, not a workbook, ...)
+        raise HTTPException(status_code=400, detail=f"Could not read {upload.filename}: {str(e)}")
+    finally:
+        await upload.close()
+    
+    return summary
+
+
+@api_router.post("/projects/import", dependencies=[Depends(rate_limit("import"))])
+async def import_projects(file: UploadFile = File(...)):
+    """Create projects from a CSV/XLSX sheet with one project per row"""
+    summary = await import_spreadsheet(file, "projects", project_create_list_adapter)
+    if summary["inserted"]:
+        await bump_revision("projects")
+    return summary
+
+
+@api_router.post("/events/import", dependencies=[Depends(rate_limit("import"))])
+async def import_events(file: UploadFile = File(...)):
+    """Create calendar events from a CSV/XLSX sheet with one event per row"""
+    summary = await import_spreadsheet(
+        file, "events", event_create_list_adapter,
+        on_insert=lambda docs: storage.count_events(docs, 1)
+    )
+    if summary["inserted"]:
+        await bump_revision("events")
+    return summary
+
+
+# Diagnostics
+# Admin-only, and disabled entirely unless ADMIN_TOKEN is set. Callers pass the
+# token in X-Admin-Token. The buffers are per worker, so each response names
+# the worker it came from.
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN', '')
+SLOW_REQUEST_MS = float(os.environ.get('SLOW_REQUEST_MS', '500'))
+PROFILE_MAX_SECONDS = float(os.environ.get('PROFILE_MAX_SECONDS', '60'))
+
+diagnostics = DiagnosticsLog(
+    slow_ms=SLOW_REQUEST_MS,
+    slow_log_size=int(os.environ.get('SLOW_REQUEST_LOG_SIZE', '50'))
+)
+profile_lock = asyncio.Lock()
+
+
+def is_admin(headers) -> bool:
+    token = headers.get("x-admin-token", "")
+    return bool(ADMIN_TOKEN) and hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode())
+
+
+async def require_admin(request: Request):
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not is_admin(request.headers):
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+
+@api_router.post("/admin/profile", dependencies=[Depends(require_admin)])
+async def profile_worker(
+    seconds: float = Query(10, gt=0, le=PROFILE_MAX_SECONDS),
+    interval_ms: float = Query(10, ge=1, le=1000)
+):
+    """Sample every thread of this worker for N seconds; returns collapsed stacks"""
+    if profile_lock.locked():
+        raise HTTPException(status_code=409, detail="A profile is already running")
+    async with profile_lock:
+        profiler = SamplingProfiler(interval_ms / 1000)
+        folded = await run_in_threadpool(profiler.run_for, seconds)
+    return Response(folded, media_type="text/plain", headers={"X-Worker": WORKER_ID})
+
+
+@api_router.get("/admin/profiles", dependencies=[Depends(require_admin)])
+async def list_request_profiles():
+    """Recent request profiles (requests sent with X-Profile: 1).
+    
+    Each samples every thread of the worker while its request ran, so the
+    stacks of the `overlapping` other requests in flight are mixed in.
+    """
+    return {
+        "worker": WORKER_ID,
+        "profiles": [
+            {
+                "id": profile["id"],
+                "samples": profile["samples"],
+                "scope": profile["scope"],
+                "overlapping": profile["overlapping"],
+                "request": profile["request"]
+            }
+            for profile in reversed(diagnostics.profiles)
+        ]
+    }
+
+
+@api_router.get("/admin/profiles/{profile_id}", dependencies=[Depends(require_admin)])
+async def get_request_profile(profile_id: str):
+    profile = diagnostics.find_profile(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return Response(profile["folded"], media_type="text/plain", headers={
+        "X-Worker": WORKER_ID,
+        "X-Profile-Scope": profile["scope"],
+        "X-Profile-Overlapping": str(profile["overlapping"])
+    })
+
+
+@api_router.get("/admin/slow-requests", dependencies=[Depends(require_admin)])
+async def get_slow_requests():
+    """Slowest recent requests on this worker with their Mongo command breakdown"""
+    return {"worker": WORKER_ID, "thresholdMs": SLOW_REQUEST_MS, "requests": diagnostics.slowest()}
+
+
+# Notifications
+# A project moving to At Risk/Delayed, or getting a new escalation, adds one
+# event to the notification outbox; that insert is all the request pays,
+# however many subscribers there are. The dispatcher (notifications.py) runs
+# every NOTIFY_POLL_SECONDS under a job lease, batches and debounces per
+# recipient and retries failed sends with backoff. Managing subscriptions
+# needs the admin token, since webhook targets are arbitrary URLs.
+NOTIFY_POLL_SECONDS = float(os.environ.get('NOTIFY_POLL_SECONDS', '5'))
+
+
+def create_dispatcher() -> NotificationDispatcher:
+    return NotificationDispatcher(
+        storage,
+        debounce_seconds=float(os.environ.get('NOTIFY_DEBOUNCE_SECONDS', '60')),
+        max_delay_seconds=float(os.environ.get('NOTIFY_MAX_DELAY_SECONDS', '300')),
+        retry_base_seconds=float(os.environ.get('NOTIFY_RETRY_BASE_SECONDS', '30')),
+        retry_max_seconds=float(os.environ.get('NOTIFY_RETRY_MAX_SECONDS', '3600')),
+        max_attempts=int(os.environ.get('NOTIFY_MAX_ATTEMPTS', '8')),
+        timeout=float(os.environ.get('NOTIFY_TIMEOUT_SECONDS', '10')),
+        smtp={
+            "host": os.environ.get('SMTP_HOST', 'localhost'),
+            "port": int(os.environ.get('SMTP_PORT', '25')),
+            "sender": os.environ.get('SMTP_FROM', 'program-pulse@localhost'),
+            "username": os.environ.get('SMTP_USERNAME', ''),
+            "password": os.environ.get('SMTP_PASSWORD', ''),
+            "starttls": os.environ.get('SMTP_STARTTLS', 'false').lower() in ('1', 'true', 'yes'),
+        }
+    )
+
+
+async def enqueue_notifications(before: dict, after: dict):
+    kinds = notification_kinds(before, after)
+    if not kinds:
+        return
+    await storage.insert("notification_outbox", {
+        "id": str(uuid.uuid4()),
+        "projectId": after["id"],
+        "projectName": after.get("name"),
+        "kinds": kinds,
+        "status": {"from": before.get("status"), "to": after.get("status")},
+        "escalation": after.get("escalation", ""),
+        "createdAt": datetime.now(timezone.utc).isoformat(),
+        "dispatchedAt": None
+    })
+
+
+@api_router.post("/notifications/subscriptions", response_model=NotificationSubscription, dependencies=[Depends(require_admin)])
+async def create_subscription(input: NotificationSubscriptionCreate):
+    if input.channel == "webhook" and not input.target.startswith(("http://", "https://")):
+        raise HTTPException(status_code=400, detail="Webhook target must be an http(s) URL")
+    if input.channel == "email" and "@" not in input.target:
+        raise HTTPException(status_code=400, detail="Email target must be an email address")
+    
+    subscription = NotificationSubscription(**input.model_dump())
+    doc = subscription.model_dump()
+    doc['createdAt'] = doc['createdAt'].isoformat()
+    await storage.insert("notification_subscriptions", doc)
+    return subscription
+
+@api_router.get("/notifications/subscriptions", response_model=List[NotificationSubscription], dependencies=[Depends(require_admin)])
+async def list_subscriptions():
+    return await storage.find("notification_subscriptions", model_fields(NotificationSubscription))
+
+@api_router.delete("/notifications/subscriptions/{subscription_id}", dependencies=[Depends(require_admin)])
+async def delete_subscription(subscription_id: str):
+    if not await storage.delete("notification_subscriptions", subscription_id):
+        raise HTTPException(status_code=404, detail="Subscription not found")
+    return {"message": "Subscription deleted successfully"}
+
 # Include the router in the main app
 app.include_router(api_router)
 
@@ -536,6 +1898,16 @@ app.add_middleware(
     allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "Last-Modified"],
+)
+
+app.add_middleware(CompressionMiddleware)
+
+app.add_middleware(
+    DiagnosticsMiddleware,
+    log=diagnostics,
+    authorize=is_admin,
+    skip_prefixes=("/api/admin",)
 )
 
 # Configure logging
@@ -544,7 +1916,3 @@ logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 )
 logger = logging.getLogger(__name__)
-
-@app.on_event("shutdown")
-async def shutdown_db_client():
-    client.close()
\ No newline at end of file
@@ -0,0 +1,1069 @@
+"""Persistence for Program Pulse.
+
+The routes talk to a storage object rather than to a database driver, so the
+same app runs against either backend:
+
+- MongoStorage keeps everything in MongoDB through Motor (the default).
+- SQLiteStorage keeps everything in one local SQLite file in WAL mode. It
+  needs no database service, which suits single-node installs, CI and
+  benchmarks. Documents are stored as JSON next to indexed columns for the
+  fields the routes filter and sort on. Calls run in a worker thread, one at
+  a time per process; WAL lets other worker processes read concurrently.
+
+Documents go in and come out as plain dicts without Mongo's _id. `fields`
+arguments name the top-level fields a caller wants back (None for all).
+"""
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Iterable, List, Optional, Tuple
+import asyncio
+import sqlite3
+import threading
+import uuid
+
+from bson.binary import Binary
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+import orjson
+
+
+# Event fields counted per day by the event_day_counts counters, besides the
+# day's total
+EVENT_COUNT_DIMENSIONS = ("category", "projectId", "color")
+
+
+def iso_week_key(day) -> str:
+    year, week, _ = day.isocalendar()
+    return f"{year}-W{week:02d}"
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _event_count_keys(event: dict) -> List[tuple]:
+    """(date, dimension, value) counters an event contributes to"""
+    day = event["date"]
+    keys = [(day, "total", "")]
+    for dimension in EVENT_COUNT_DIMENSIONS:
+        if event.get(dimension) is not None:
+            keys.append((day, dimension, str(event[dimension])))
+    return keys
+
+
+def _count_changes(events: List[dict], delta: int) -> Counter:
+    changes = Counter()
+    for event in events:
+        for key in _event_count_keys(event):
+            changes[key] += delta
+    return changes
+
+
+def _projection(fields: Optional[Iterable[str]]) -> dict:
+    projection = {"_id": 0}
+    if fields is not None:
+        projection.update({name: 1 for name in fields})
+    return projection
+
+
+class MongoStorage:
+    def __init__(self, url: str, db_name: str, event_listeners: Iterable = ()):
+        self.url = url
+        self.db_name = db_name
+        self.event_listeners = list(event_listeners)
+        self.client = None
+        self.db = None
+
+    async def open(self):
+        self.client = AsyncIOMotorClient(self.url, event_listeners=self.event_listeners)
+        self.db = self.client[self.db_name]
+        await self.db.project_history.create_index([("projectId", 1), ("updatedAt", 1)])
+        await self.db.history_diff_cache.create_index("projectId")
+        await self.db.history_diff_cache.create_index("expiresAt", expireAfterSeconds=0)
+        await self.db.project_history_archive.create_index([("projectId", 1), ("year", 1)])
+        await self.db.rate_limits.create_index("expiresAt", expireAfterSeconds=0)
+        await self.db.event_day_counts.create_index([("dim", 1), ("date", 1)])
+        # iter_events sorts by date, optionally filtered by category or project
+        await self.db.events.create_index("date")
+        await self.db.events.create_index([("category", 1), ("date", 1)])
+        await self.db.events.create_index([("projectId", 1), ("date", 1)])
+        await self.db.projects.create_index("id")
+        await self.db.notification_outbox.create_index([("dispatchedAt", 1), ("createdAt", 1)])
+        await self.db.notification_batches.create_index([("recipient", 1), ("state", 1)])
+        await self.db.notification_batches.create_index("state")
+
+    async def close(self):
+        self.client.close()
+
+    # Revisions and leases
+    async def bump_revision(self, *collections: str):
+        now = _now().isoformat()
+        for collection in collections:
+            await self.db.revisions.update_one(
+                {"_id": collection},
+                {"$inc": {"rev": 1}, "$set": {"updatedAt": now}},
+                upsert=True
+            )
+
+    async def get_revisions(self, collections: List[str]) -> dict:
+        docs = await self.db.revisions.find({"_id": {"$in": collections}}).to_list(len(collections))
+        return {doc["_id"]: {"rev": doc.get("rev", 0), "updatedAt": doc.get("updatedAt")} for doc in docs}
+
+    async def acquire_lease(self, name: str, owner: str, expires_at: datetime) -> bool:
+        try:
+            await self.db.job_leases.find_one_and_update(
+                {"_id": name, "expiresAt": {"$lt": _now()}},
+                {"$set": {"owner": owner, "expiresAt": expires_at}},
+                upsert=True
+            )
+            return True
+        except DuplicateKeyError:
+            # The lease document exists and has not expired: another worker holds it
+            return False
+
+    # Documents keyed by "id" (projects, events, notification state)
+    async def insert(self, collection: str, doc: dict):
+        await self.db[collection].insert_one(dict(doc))
+
+    async def insert_many(self, collection: str, docs: List[dict]) -> Tuple[int, List[tuple]]:
+        """Insert without stopping at failures; returns (inserted, [(index, message)])"""
+        try:
+            result = await self.db[collection].insert_many([dict(doc) for doc in docs], ordered=False)
+            return len(result.inserted_ids), []
+        except BulkWriteError as e:
+            write_errors = e.details.get("writeErrors", [])
+            inserted = e.details.get("nInserted", len(docs) - len(write_errors))
+            return inserted, [(error["index"], error.get("errmsg", "Write failed")) for error in write_errors]
+
+    async def find(self, collection: str, fields: Optional[Iterable[str]] = None,
+                   ids: Optional[List[str]] = None, limit: int = 1000) -> List[dict]:
+        query = {"id": {"$in": ids}} if ids else {}
+        return await self.db[collection].find(query, _projection(fields)).to_list(limit)
+
+    async def get(self, collection: str, doc_id: str) -> Optional[dict]:
+        return await self.db[collection].find_one({"id": doc_id}, {"_id": 0})
+
+    async def update(self, collection: str, doc_id: str, changes: dict) -> Optional[dict]:
+        return await self.db[collection].find_one_and_update(
+            {"id": doc_id},
+            {"$set": changes},
+            projection={"_id": 0},
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def delete(self, collection: str, doc_id: str) -> Optional[dict]:
+        """Delete a document; returns it, or None when there was none"""
+        return await self.db[collection].find_one_and_delete({"id": doc_id}, projection={"_id": 0})
+
+    async def find_events_with_project(self, fields: Iterable[str], project_fields: Iterable[str],
+                                       limit: int = 1000) -> List[dict]:
+        """Events with their linked project (or None) under "project", in one $lookup"""
+        # Plain localField/foreignField $lookup, which every supported server
+        # version runs; the project is trimmed to its fields afterwards
+        projection = _projection(fields)
+        projection.update({f"project.{name}": 1 for name in project_fields})
+        pipeline = [
+            {"$limit": limit},
+            {"$lookup": {
+                "from": "projects",
+                "localField": "projectId",
+                "foreignField": "id",
+                "as": "project"
+            }},
+            {"$project": projection},
+            {"$set": {"project": {"$ifNull": [{"$arrayElemAt": ["$project", 0]}, None]}}}
+        ]
+        return await self.db.events.aggregate(pipeline).to_list(limit)
+
+    async def iter_events(self, fields: Iterable[str], category: Optional[str] = None,
+                          project_id: Optional[str] = None):
+        """Events in date order"""
+        query = {}
+        if category:
+            query["category"] = category
+        if project_id:
+            query["projectId"] = project_id
+        async for event in self.db.events.find(query, _projection(fields)).sort("date", 1):
+            yield event
+
+    # Notifications
+    async def claim_notification_events(self, stale_before: str, limit: int) -> List[dict]:
+        """Mark undispatched outbox events (or ones whose dispatch stalled) as taken"""
+        now = _now().isoformat()
+        claimed = []
+        while len(claimed) < limit:
+            event = await self.db.notification_outbox.find_one_and_update(
+                {"$or": [{"dispatchedAt": None}, {"dispatchedAt": {"$lte": stale_before}}]},
+                {"$set": {"dispatchedAt": now}},
+                sort=[("createdAt", 1)],
+                projection={"_id": 0}
+            )
+            if event is None:
+                break
+            claimed.append(event)
+        return claimed
+
+    async def add_to_notification_batch(self, recipient: dict, event: dict, now: str):
+        """Append an event to the recipient's open batch, opening one if needed"""
+        await self.db.notification_batches.update_one(
+            {"recipient": recipient["recipient"], "state": "open"},
+            {
+                "$push": {"events": event},
+                "$set": {"lastEventAt": now},
+                "$setOnInsert": {**recipient, "id": str(uuid.uuid4()), "openedAt": now, "attempts": 0}
+            },
+            upsert=True
+        )
+
+    async def claim_notification_batches(self, now: str, quiet_before: str, opened_before: str,
+                                         stale_before: str, limit: int) -> List[dict]:
+        """Take batches that are ready to send and mark them as sending"""
+        ready = {"$or": [
+            {"state": "open", "$or": [{"lastEventAt": {"$lte": quiet_before}}, {"openedAt": {"$lte": opened_before}}]},
+            {"state": "retry", "nextAttemptAt": {"$lte": now}},
+            {"state": "sending", "claimedAt": {"$lte": stale_before}}
+        ]}
+        claimed = []
+        while len(claimed) < limit:
+            claim = {"state": "sending", "claimedAt": now}
+            batch = await self.db.notification_batches.find_one_and_update(
+                ready, {"$set": claim}, projection={"_id": 0}
+            )
+            if batch is None:
+                break
+            claimed.append({**batch, **claim})
+        return claimed
+
+    # Per-day event counters
+    async def count_events(self, events: List[dict], delta: int):
+        """Add `delta` to every counter the given events contribute to"""
+        changes = _count_changes(events, delta)
+        if not changes:
+            return
+        await self.db.event_day_counts.bulk_write([
+            UpdateOne(
+                {"_id": f"{day}|{dimension}|{value}"},
+                {"$inc": {"count": change}, "$setOnInsert": {"date": day, "dim": dimension, "value": value}},
+                upsert=True
+            )
+            for (day, dimension, value), change in changes.items()
+        ], ordered=False)
+        if delta < 0:
+            await self.db.event_day_counts.delete_many({"count": {"$lte": 0}})
+
+    async def rebuild_event_counts(self):
+        """Recompute every counter from the events collection"""
+        dimensions = [{"dim": "total", "value": ""}]
+        dimensions += [{"dim": dimension, "value": f"${dimension}"} for dimension in EVENT_COUNT_DIMENSIONS]
+        pipeline = [
+            {"$project": {"_id": 0, "date": 1, "keys": dimensions}},
+            {"$unwind": "$keys"},
+            {"$match": {"keys.value": {"$ne": None}}},
+            {"$group": {
+                "_id": {"date": "$date", "dim": "$keys.dim", "value": {"$toString": "$keys.value"}},
+                "count": {"$sum": 1}
+            }},
+            {"$project": {
+                "_id": {"$concat": ["$_id.date", "|", "$_id.dim", "|", "$_id.value"]},
+                "date": "$_id.date",
+                "dim": "$_id.dim",
+                "value": "$_id.value",
+                "count": 1
+            }},
+            {"$out": "event_day_counts"}
+        ]
+        await self.db.events.aggregate(pipeline).to_list(None)
+        await self.db.event_day_counts.create_index([("dim", 1), ("date", 1)])
+
+    async def event_facets(self, start: Optional[str], end: Optional[str]) -> dict:
+        """Event counts per dimension value between two days (inclusive)"""
+        match = {"dim": {"$in": list(EVENT_COUNT_DIMENSIONS)}}
+        if start or end:
+            match["date"] = {**({"$gte": start} if start else {}), **({"$lte": end} if end else {})}
+        pipeline = [
+            {"$match": match},
+            {"$group": {"_id": {"dim": "$dim", "value": "$value"}, "count": {"$sum": "$count"}}},
+            {"$match": {"count": {"$gt": 0}}}
+        ]
+        facets = {dimension: {} for dimension in EVENT_COUNT_DIMENSIONS}
+        async for row in self.db.event_day_counts.aggregate(pipeline):
+            facets[row["_id"]["dim"]][row["_id"]["value"]] = row["count"]
+        return facets
+
+    async def event_day_totals(self, start: str, end: str) -> dict:
+        """Events per day between two days (inclusive)"""
+        cursor = self.db.event_day_counts.find(
+            {"dim": "total", "date": {"$gte": start, "$lte": end}, "count": {"$gt": 0}},
+            {"_id": 0, "date": 1, "count": 1}
+        ).sort("date", 1)
+        return {row["date"]: row["count"] async for row in cursor}
+
+    # History
+    async def insert_history(self, doc: dict):
+        await self.db.project_history.insert_one(dict(doc))
+
+    async def coalesce_history(self, project_id: str, since: str, edited_at: str) -> bool:
+        """Count an edit against the project's newest snapshot taken at or after `since`"""
+        pending = await self.db.project_history.find_one_and_update(
+            {"projectId": project_id, "updatedAt": {"$gte": since}},
+            {"$inc": {"coalescedEdits": 1}, "$set": {"lastEditAt": edited_at}},
+            sort=[("updatedAt", -1)],
+            projection={"_id": 1}
+        )
+        return pending is not None
+
+    async def list_history(self, project_id: str, fields: Iterable[str], limit: int) -> List[dict]:
+        """Hot snapshots of a project, newest first"""
+        return await self.db.project_history.find(
+            {"projectId": project_id}, _projection(fields)
+        ).sort("updatedAt", -1).to_list(limit)
+
+    async def iter_history(self, project_id: str, after: Optional[str], fields: Iterable[str], limit: int):
+        """Hot snapshots of a project from `after` on, oldest first"""
+        query = {"projectId": project_id}
+        if after:
+            query["updatedAt"] = {"$gte": after}
+        cursor = self.db.project_history.find(query, _projection(fields)).sort("updatedAt", 1).limit(limit)
+        async for snapshot in cursor:
+            yield snapshot
+
+    async def earliest_history(self, since: str) -> dict:
+        """Each project's first hot snapshot taken at or after `since`, by project id"""
+        pipeline = [
+            {"$match": {"updatedAt": {"$gte": since}}},
+            {"$sort": {"projectId": 1, "updatedAt": 1}},
+            {"$group": {"_id": "$projectId", "snapshot": {"$first": "$$ROOT"}}},
+            {"$replaceRoot": {"newRoot": "$snapshot"}},
+            {"$project": {"_id": 0}}
+        ]
+        return {snapshot["projectId"]: snapshot async for snapshot in self.db.project_history.aggregate(pipeline)}
+
+    async def history_before(self, project_id: str, cutoff: str) -> List[dict]:
+        return await self.db.project_history.find(
+            {"projectId": project_id, "updatedAt": {"$lt": cutoff}}, {"_id": 0}
+        ).to_list(None)
+
+    async def delete_history(self, project_id: str, before: Optional[str] = None):
+        query = {"projectId": project_id}
+        if before:
+            query["updatedAt"] = {"$lt": before}
+        await self.db.project_history.delete_many(query)
+
+    async def projects_with_history_before(self, cutoff: str) -> List[str]:
+        return await self.db.project_history.distinct("projectId", {"updatedAt": {"$lt": cutoff}})
+
+    async def week_openings(self, since: str, project_ids: Optional[List[str]]) -> dict:
+        """Earliest hot snapshot per (project, ISO week) from `since` on"""
+        match = {"updatedAt": {"$gte": since}}
+        if project_ids:
+            match["projectId"] = {"$in": project_ids}
+
+        pipeline = [
+            {"$match": match},
+            {"$sort": {"projectId": 1, "updatedAt": 1}},
+            {"$group": {
+                "_id": {
+                    "projectId": "$projectId",
+                    "week": {"$dateToString": {
+                        "format": "%G-W%V",
+                        "date": {"$dateFromString": {"dateString": "$updatedAt"}}
+                    }}
+                },
+                "status": {"$first": "$status"},
+                "bugs": {"$first": "$bugs"}
+            }}
+        ]
+
+        openings = {}
+        async for row in self.db.project_history.aggregate(pipeline):
+            openings[(row["_id"]["projectId"], row["_id"]["week"])] = {"status": row["status"], "bugs": row["bugs"]}
+        return openings
+
+    # History archive
+    async def archive_segments(self, project_ids: Optional[List[str]] = None,
+                               ending_after: Optional[str] = None) -> List[dict]:
+        """Archive segments ordered by project and year"""
+        query = {}
+        if project_ids:
+            query["projectId"] = {"$in": project_ids}
+        if ending_after:
+            query["to"] = {"$gte": ending_after}
+        return await self.db.project_history_archive.find(
+            query, {"_id": 0, "projectId": 1, "year": 1, "payload": 1}
+        ).sort([("projectId", 1), ("year", 1)]).to_list(None)
+
+    async def get_archive_segment(self, segment_id: str) -> Optional[dict]:
+        return await self.db.project_history_archive.find_one({"_id": segment_id}, {"_id": 0})
+
+    async def put_archive_segment(self, segment_id: str, segment: dict):
+        await self.db.project_history_archive.replace_one(
+            {"_id": segment_id},
+            {**segment, "payload": Binary(segment["payload"])},
+            upsert=True
+        )
+
+    async def delete_archive(self, project_id: str):
+        await self.db.project_history_archive.delete_many({"projectId": project_id})
+
+    # Weekly snapshots
+    async def insert_weekly_snapshot(self, snapshot: dict, artifact: dict) -> bool:
+        """Store a closed week once; returns False when the week was already closed"""
+        try:
+            await self.db.weekly_snapshots.insert_one({"_id": snapshot["week"], **snapshot})
+        except DuplicateKeyError:
+            return False
+        await self.put_weekly_artifact(snapshot["week"], artifact)
+        return True
+
+    async def put_weekly_artifact(self, week: str, artifact: dict):
+        await self.db.weekly_snapshot_artifacts.replace_one(
+            {"_id": week},
+            {**artifact, "data": Binary(artifact["data"])},
+            upsert=True
+        )
+
+    async def list_weekly_snapshots(self, fields: Iterable[str], limit: int) -> List[dict]:
+        """Closed weeks, newest first"""
+        return await self.db.weekly_snapshots.find({}, _projection(fields)).sort("_id", -1).to_list(limit)
+
+    async def get_weekly_snapshot(self, week: str, fields: Optional[Iterable[str]] = None) -> Optional[dict]:
+        return await self.db.weekly_snapshots.find_one({"_id": week}, _projection(fields))
+
+    async def get_weekly_artifact(self, week: str) -> Optional[dict]:
+        return await self.db.weekly_snapshot_artifacts.find_one({"_id": week}, {"_id": 0})
+
+    # History diff cache
+    async def get_diff_page(self, key: str) -> Optional[dict]:
+        cached = await self.db.history_diff_cache.find_one({"_id": key}, {"_id": 0, "page": 1})
+        return cached["page"] if cached else None
+
+    async def put_diff_page(self, key: str, project_id: str, page: dict, expires_at: datetime):
+        await self.db.history_diff_cache.update_one(
+            {"_id": key},
+            {"$set": {"projectId": project_id, "page": page, "expiresAt": expires_at}},
+            upsert=True
+        )
+
+    async def drop_diff_pages(self, project_ids: List[str]):
+        await self.db.history_diff_cache.delete_many({"projectId": {"$in": project_ids}})
+
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS projects (
+    id TEXT PRIMARY KEY,
+    doc TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS events (
+    id TEXT PRIMARY KEY,
+    date TEXT NOT NULL,
+    category TEXT,
+    project_id TEXT,
+    doc TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS events_date ON events (date, id);
+CREATE INDEX IF NOT EXISTS events_category ON events (category, date);
+CREATE INDEX IF NOT EXISTS events_project ON events (project_id, date);
+CREATE TABLE IF NOT EXISTS project_history (
+    id TEXT PRIMARY KEY,
+    project_id TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    doc TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS project_history_project ON project_history (project_id, updated_at);
+CREATE INDEX IF NOT EXISTS project_history_updated ON project_history (updated_at);
+CREATE TABLE IF NOT EXISTS project_history_archive (
+    id TEXT PRIMARY KEY,
+    project_id TEXT NOT NULL,
+    year INTEGER NOT NULL,
+    ends_at TEXT NOT NULL,
+    doc TEXT NOT NULL,
+    payload BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS project_history_archive_project ON project_history_archive (project_id, year);
+CREATE TABLE IF NOT EXISTS history_diff_cache (
+    key TEXT PRIMARY KEY,
+    project_id TEXT NOT NULL,
+    expires_at TEXT NOT NULL,
+    page TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS history_diff_cache_project ON history_diff_cache (project_id);
+CREATE TABLE IF NOT EXISTS event_day_counts (
+    dim TEXT NOT NULL,
+    date TEXT NOT NULL,
+    value TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (dim, date, value)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS weekly_snapshots (
+    week TEXT PRIMARY KEY,
+    doc TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS weekly_snapshot_artifacts (
+    week TEXT PRIMARY KEY,
+    doc TEXT NOT NULL,
+    data BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS notification_subscriptions (
+    id TEXT PRIMARY KEY,
+    doc TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS notification_outbox (
+    id TEXT PRIMARY KEY,
+    created_at TEXT NOT NULL,
+    dispatched_at TEXT,
+    doc TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS notification_outbox_pending ON notification_outbox (dispatched_at, created_at);
+CREATE TABLE IF NOT EXISTS notification_batches (
+    id TEXT PRIMARY KEY,
+    recipient TEXT NOT NULL,
+    state TEXT NOT NULL,
+    opened_at TEXT NOT NULL,
+    last_event_at TEXT,
+    next_attempt_at TEXT,
+    claimed_at TEXT,
+    doc TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS notification_batches_recipient ON notification_batches (recipient, state);
+CREATE INDEX IF NOT EXISTS notification_batches_state ON notification_batches (state);
+CREATE TABLE IF NOT EXISTS revisions (
+    name TEXT PRIMARY KEY,
+    rev INTEGER NOT NULL,
+    updated_at TEXT
+);
+CREATE TABLE IF NOT EXISTS job_leases (
+    name TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    expires_at TEXT NOT NULL
+);
+"""
+
+# Columns kept alongside the JSON document, derived from it on every write.
+# Listing reads go in rowid order, i.e. insertion order like a Mongo scan.
+SQLITE_INDEXED = {
+    "projects": {},
+    "events": {"date": "date", "category": "category", "project_id": "projectId"},
+    "notification_subscriptions": {},
+    "notification_outbox": {"created_at": "createdAt", "dispatched_at": "dispatchedAt"},
+    "notification_batches": {
+        "recipient": "recipient",
+        "state": "state",
+        "opened_at": "openedAt",
+        "last_event_at": "lastEventAt",
+        "next_attempt_at": "nextAttemptAt",
+        "claimed_at": "claimedAt",
+    },
+}
+
+
+def _dumps(value) -> str:
+    return orjson.dumps(value).decode()
+
+
+def _pick(doc: dict, fields: Optional[Iterable[str]]) -> dict:
+    if fields is None:
+        return doc
+    return {name: doc[name] for name in fields if name in doc}
+
+
+class SQLiteStorage:
+    def __init__(self, path: str):
+        self.path = path
+        self._conn = None
+        self._lock = threading.Lock()
+
+    async def open(self):
+        def connect():
+            conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(SQLITE_SCHEMA)
+            return conn
+        self._conn = await asyncio.to_thread(connect)
+
+    async def close(self):
+        await self._call(lambda conn: None)
+        self._conn.close()
+
+    async def _call(self, work, *args):
+        """Run work(conn, *args) in a worker thread inside one transaction"""
+        def run():
+            with self._lock, self._conn:
+                return work(self._conn, *args)
+        return await asyncio.to_thread(run)
+
+    # Revisions and leases
+    async def bump_revision(self, *collections: str):
+        now = _now().isoformat()
+
+        def work(conn):
+            conn.executemany(
+                "INSERT INTO revisions (name, rev, updated_at) VALUES (?, 1, ?) "
+                "ON CONFLICT (name) DO UPDATE SET rev = rev + 1, updated_at = excluded.updated_at",
+                [(collection, now) for collection in collections]
+            )
+        await self._call(work)
+
+    async def get_revisions(self, collections: List[str]) -> dict:
+        def work(conn):
+            rows = conn.execute(
+                f"SELECT name, rev, updated_at FROM revisions WHERE name IN ({','.join('?' * len(collections))})",
+                collections
+            ).fetchall()
+            return {name: {"rev": rev, "updatedAt": updated_at} for name, rev, updated_at in rows}
+        return await self._call(work)
+
+    async def acquire_lease(self, name: str, owner: str, expires_at: datetime) -> bool:
+        def work(conn):
+            cursor = conn.execute(
+                "INSERT INTO job_leases (name, owner, expires_at) VALUES (?, ?, ?) "
+                "ON CONFLICT (name) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at "
+                "WHERE job_leases.expires_at < ?",
+                (name, owner, expires_at.isoformat(), _now().isoformat())
+            )
+            return cursor.rowcount == 1
+        return await self._call(work)
+
+    # Documents keyed by "id" (projects, events, notification state)
+    @staticmethod
+    def _row(collection: str, doc: dict) -> tuple:
+        columns = SQLITE_INDEXED[collection]
+        return (doc["id"], *(doc.get(field) for field in columns.values()), _dumps(doc))
+
+    @staticmethod
+    def _insert_sql(collection: str) -> str:
+        columns = ["id", *SQLITE_INDEXED[collection], "doc"]
+        return f"INSERT INTO {collection} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+
+    async def insert(self, collection: str, doc: dict):
+        await self._call(lambda conn: conn.execute(self._insert_sql(collection), self._row(collection, doc)))
+
+    async def insert_many(self, collection: str, docs: List[dict]) -> Tuple[int, List[tuple]]:
+        """Insert without stopping at failures; returns (inserted, [(index, message)])"""
+        def work(conn):
+            sql = self._insert_sql(collection)
+            errors = []
+            for index, doc in enumerate(docs):
+                try:
+                    conn.execute(sql, self._row(collection, doc))
+                except sqlite3.IntegrityError as e:
+                    errors.append((index, str(e)))
+            return len(docs) - len(errors), errors
+        return await self._call(work)
+
+    async def find(self, collection: str, fields: Optional[Iterable[str]] = None,
+                   ids: Optional[List[str]] = None, limit: int = 1000) -> List[dict]:
+        def work(conn):
+            if ids:
+                rows = conn.execute(
+                    f"SELECT doc FROM {collection} WHERE id IN ({','.join('?' * len(ids))}) ORDER BY rowid LIMIT ?",
+                    (*ids, limit)
+                ).fetchall()
+            else:
+                rows = conn.execute(f"SELECT doc FROM {collection} ORDER BY rowid LIMIT ?", (limit,)).fetchall()
+            return [_pick(orjson.loads(doc), fields) for doc, in rows]
+        return await self._call(work)
+
+    async def get(self, collection: str, doc_id: str) -> Optional[dict]:
+        def work(conn):
+            row = conn.execute(f"SELECT doc FROM {collection} WHERE id = ?", (doc_id,)).fetchone()
+            return orjson.loads(row[0]) if row else None
+        return await self._call(work)
+
+    @staticmethod
+    def _rewrite(conn, collection: str, doc: dict):
+        columns = SQLITE_INDEXED[collection]
+        assignments = "".join(f"{column} = ?, " for column in columns)
+        conn.execute(
+            f"UPDATE {collection} SET {assignments}doc = ? WHERE id = ?",
+            (*(doc.get(field) for field in columns.values()), _dumps(doc), doc["id"])
+        )
+
+    async def update(self, collection: str, doc_id: str, changes: dict) -> Optional[dict]:
+        def work(conn):
+            row = conn.execute(f"SELECT doc FROM {collection} WHERE id = ?", (doc_id,)).fetchone()
+            if row is None:
+                return None
+            doc = {**orjson.loads(row[0]), **changes}
+            self._rewrite(conn, collection, doc)
+            return doc
+        return await self._call(work)
+
+    async def delete(self, collection: str, doc_id: str) -> Optional[dict]:
+        """Delete a document; returns it, or None when there was none"""
+        def work(conn):
+            row = conn.execute(f"DELETE FROM {collection} WHERE id = ? RETURNING doc", (doc_id,)).fetchone()
+            return orjson.loads(row[0]) if row else None
+        return await self._call(work)
+
+    async def find_events_with_project(self, fields: Iterable[str], project_fields: Iterable[str],
+                                       limit: int = 1000) -> List[dict]:
+        """Events with their linked project (or None) under "project", in one join"""
+        def work(conn):
+            return conn.execute(
+                "SELECT events.doc, projects.doc FROM events "
+                "LEFT JOIN projects ON projects.id = events.project_id ORDER BY events.rowid LIMIT ?",
+                (limit,)
+            ).fetchall()
+        return [
+            {**_pick(orjson.loads(event), fields), "project": _pick(orjson.loads(project), project_fields) if project else None}
+            for event, project in await self._call(work)
+        ]
+
+    async def iter_events(self, fields: Iterable[str], category: Optional[str] = None,
+                          project_id: Optional[str] = None, batch_size: int = 500):
+        """Events in date order, read in keyset pages so no cursor stays open"""
+        conditions = []
+        params = []
+        if category:
+            conditions.append("category = ?")
+            params.append(category)
+        if project_id:
+            conditions.append("project_id = ?")
+            params.append(project_id)
+
+        def page(conn, last):
+            where = list(conditions)
+            args = list(params)
+            if last:
+                where.append("(date, id) > (?, ?)")
+                args.extend(last)
+            sql = "SELECT date, id, doc FROM events"
+            if where:
+                sql += " WHERE " + " AND ".join(where)
+            return conn.execute(f"{sql} ORDER BY date, id LIMIT ?", (*args, batch_size)).fetchall()
+
+        last = None
+        while True:
+            rows = await self._call(page, last)
+            for _, _, doc in rows:
+                yield _pick(orjson.loads(doc), fields)
+            if len(rows) < batch_size:
+                return
+            last = rows[-1][:2]
+
+    # Notifications
+    async def claim_notification_events(self, stale_before: str, limit: int) -> List[dict]:
+        """Mark undispatched outbox events (or ones whose dispatch stalled) as taken"""
+        def work(conn):
+            rows = conn.execute(
+                "SELECT doc FROM notification_outbox WHERE dispatched_at IS NULL OR dispatched_at <= ? "
+                "ORDER BY created_at LIMIT ?",
+                (stale_before, limit)
+            ).fetchall()
+            now = _now().isoformat()
+            claimed = [{**orjson.loads(doc), "dispatchedAt": now} for doc, in rows]
+            for event in claimed:
+                self._rewrite(conn, "notification_outbox", event)
+            return claimed
+        return await self._call(work)
+
+    async def add_to_notification_batch(self, recipient: dict, event: dict, now: str):
+        """Append an event to the recipient's open batch, opening one if needed"""
+        def work(conn):
+            row = conn.execute(
+                "SELECT doc FROM notification_batches WHERE recipient = ? AND state = 'open'",
+                (recipient["recipient"],)
+            ).fetchone()
+            if row is None:
+                batch = {
+                    **recipient, "id": str(uuid.uuid4()), "state": "open", "openedAt": now,
+                    "lastEventAt": now, "attempts": 0, "events": [event]
+                }
+                conn.execute(self._insert_sql("notification_batches"), self._row("notification_batches", batch))
+                return
+            batch = orjson.loads(row[0])
+            batch["events"].append(event)
+            batch["lastEventAt"] = now
+            self._rewrite(conn, "notification_batches", batch)
+        await self._call(work)
+
+    async def claim_notification_batches(self, now: str, quiet_before: str, opened_before: str,
+                                         stale_before: str, limit: int) -> List[dict]:
+        """Take batches that are ready to send and mark them as sending"""
+        def work(conn):
+            rows = conn.execute(
+                "SELECT doc FROM notification_batches WHERE "
+                "(state = 'open' AND (last_event_at <= ? OR opened_at <= ?)) "
+                "OR (state = 'retry' AND next_attempt_at <= ?) "
+                "OR (state = 'sending' AND claimed_at <= ?) "
+                "ORDER BY opened_at LIMIT ?",
+                (quiet_before, opened_before, now, stale_before, limit)
+            ).fetchall()
+            claimed = [{**orjson.loads(doc), "state": "sending", "claimedAt": now} for doc, in rows]
+            for batch in claimed:
+                self._rewrite(conn, "notification_batches", batch)
+            return claimed
+        return await self._call(work)
+
+    # Per-day event counters
+    async def count_events(self, events: List[dict], delta: int):
+        """Add `delta` to every counter the given events contribute to"""
+        changes = _count_changes(events, delta)
+        if not changes:
+            return
+
+        def work(conn):
+            conn.executemany(
+                "INSERT INTO event_day_counts (date, dim, value, count) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (dim, date, value) DO UPDATE SET count = count + excluded.count",
+                [(*key, change) for key, change in changes.items()]
+            )
+            if delta < 0:
+                conn.execute("DELETE FROM event_day_counts WHERE count <= 0")
+        await self._call(work)
+
+    async def rebuild_event_counts(self):
+        """Recompute every counter from the events table"""
+        def work(conn):
+            conn.execute("DELETE FROM event_day_counts")
+            conn.execute(
+                "INSERT INTO event_day_counts (date, dim, value, count) "
+                "SELECT date, dim, value, COUNT(*) FROM ("
+                "  SELECT date, 'total' AS dim, '' AS value FROM events"
+                "  UNION ALL SELECT date, 'category', category FROM events WHERE category IS NOT NULL"
+                "  UNION ALL SELECT date, 'projectId', project_id FROM events WHERE project_id IS NOT NULL"
+                "  UNION ALL SELECT date, 'color', json_extract(doc, '$.color') FROM events"
+                "    WHERE json_extract(doc, '$.color') IS NOT NULL"
+                ") GROUP BY date, dim, value"
+            )
+        await self._call(work)
+
+    async def event_facets(self, start: Optional[str], end: Optional[str]) -> dict:
+        """Event counts per dimension value between two days (inclusive)"""
+        def work(conn):
+            return conn.execute(
+                "SELECT dim, value, SUM(count) FROM event_day_counts "
+                "WHERE dim IN (?, ?, ?) AND date >= ? AND date <= ? GROUP BY dim, value HAVING SUM(count) > 0",
+                (*EVENT_COUNT_DIMENSIONS, start or "", end or "\uffff")
+            ).fetchall()
+        facets = {dimension: {} for dimension in EVENT_COUNT_DIMENSIONS}
+        for dimension, value, count in await self._call(work):
+            facets[dimension][value] = count
+        return facets
+
+    async def event_day_totals(self, start: str, end: str) -> dict:
+        """Events per day between two days (inclusive)"""
+        def work(conn):
+            return conn.execute(
+                "SELECT date, count FROM event_day_counts "
+                "WHERE dim = 'total' AND date >= ? AND date <= ? AND count > 0 ORDER BY date",
+                (start, end)
+            ).fetchall()
+        return dict(await self._call(work))
+
+    # History
+    async def insert_history(self, doc: dict):
+        await self._call(lambda conn: conn.execute(
+            "INSERT INTO project_history (id, project_id, updated_at, doc) VALUES (?, ?, ?, ?)",
+            (doc["id"], doc["projectId"], doc["updatedAt"], _dumps(doc))
+        ))
+
+    async def coalesce_history(self, project_id: str, since: str, edited_at: str) -> bool:
+        """Count an edit against the project's newest snapshot taken at or after `since`"""
+        def work(conn):
+            row = conn.execute(
+                "SELECT id, doc FROM project_history WHERE project_id = ? AND updated_at >= ? "
+                "ORDER BY updated_at DESC LIMIT 1",
+                (project_id, since)
+            ).fetchone()
+            if row is None:
+                return False
+            doc = orjson.loads(row[1])
+            doc["coalescedEdits"] = doc.get("coalescedEdits", 0) + 1
+            doc["lastEditAt"] = edited_at
+            conn.execute("UPDATE project_history SET doc = ? WHERE id = ?", (_dumps(doc), row[0]))
+            return True
+        return await self._call(work)
+
+    async def list_history(self, project_id: str, fields: Iterable[str], limit: int) -> List[dict]:
+        """Hot snapshots of a project, newest first"""
+        def work(conn):
+            rows = conn.execute(
+                "SELECT doc FROM project_history WHERE project_id = ? ORDER BY updated_at DESC LIMIT ?",
+                (project_id, limit)
+            ).fetchall()
+            return [_pick(orjson.loads(doc), fields) for doc, in rows]
+        return await self._call(work)
+
+    async def iter_history(self, project_id: str, after: Optional[str], fields: Iterable[str], limit: int):
+        """Hot snapshots of a project from `after` on, oldest first"""
+        def work(conn):
+            return conn.execute(
+                "SELECT doc FROM project_history WHERE project_id = ? AND updated_at >= ? "
+                "ORDER BY updated_at LIMIT ?",
+                (project_id, after or "", limit)
+            ).fetchall()
+        for doc, in await self._call(work):
+            yield _pick(orjson.loads(doc), fields)
+
+    async def earliest_history(self, since: str) -> dict:
+        """Each project's first hot snapshot taken at or after `since`, by project id"""
+        def work(conn):
+            return conn.execute(
+                "SELECT project_id, doc FROM project_history WHERE updated_at >= ? ORDER BY project_id, updated_at",
+                (since,)
+            ).fetchall()
+        earliest = {}
+        for project_id, doc in await self._call(work):
+            if project_id not in earliest:
+                earliest[project_id] = orjson.loads(doc)
+        return earliest
+
+    async def history_before(self, project_id: str, cutoff: str) -> List[dict]:
+        def work(conn):
+            rows = conn.execute(
+                "SELECT doc FROM project_history WHERE project_id = ? AND updated_at < ?",
+                (project_id, cutoff)
+            ).fetchall()
+            return [orjson.loads(doc) for doc, in rows]
+        return await self._call(work)
+
+    async def delete_history(self, project_id: str, before: Optional[str] = None):
+        if before:
+            await self._call(lambda conn: conn.execute(
+                "DELETE FROM project_history WHERE project_id = ? AND updated_at < ?", (project_id, before)
+            ))
+        else:
+            await self._call(lambda conn: conn.execute(
+                "DELETE FROM project_history WHERE project_id = ?", (project_id,)
+            ))
+
+    async def projects_with_history_before(self, cutoff: str) -> List[str]:
+        def work(conn):
+            rows = conn.execute(
+                "SELECT DISTINCT project_id FROM project_history WHERE updated_at < ?", (cutoff,)
+            ).fetchall()
+            return [project_id for project_id, in rows]
+        return await self._call(work)
+
+    async def week_openings(self, since: str, project_ids: Optional[List[str]]) -> dict:
+        """Earliest hot snapshot per (project, ISO week) from `since` on"""
+        def work(conn):
+            sql = (
+                "SELECT project_id, updated_at, json_extract(doc, '$.status'), json_extract(doc, '$.bugs') "
+                "FROM project_history WHERE updated_at >= ?"
+            )
+            args = [since]
+            if project_ids:
+                sql += f" AND project_id IN ({','.join('?' * len(project_ids))})"
+                args.extend(project_ids)
+            return conn.execute(sql + " ORDER BY project_id, updated_at", args).fetchall()
+
+        openings = {}
+        for project_id, updated_at, status, bugs in await self._call(work):
+            key = (project_id, iso_week_key(datetime.fromisoformat(updated_at)))
+            if key not in openings:
+                openings[key] = {"status": status, "bugs": orjson.loads(bugs) if bugs else None}
+        return openings
+
+    # History archive
+    async def archive_segments(self, project_ids: Optional[List[str]] = None,
+                               ending_after: Optional[str] = None) -> List[dict]:
+        """Archive segments ordered by project and year"""
+        def work(conn):
+            where = []
+            args = []
+            if project_ids:
+                where.append(f"project_id IN ({','.join('?' * len(project_ids))})")
+                args.extend(project_ids)
+            if ending_after:
+                where.append("ends_at >= ?")
+                args.append(ending_after)
+            sql = "SELECT project_id, year, payload FROM project_history_archive"
+            if where:
+                sql += " WHERE " + " AND ".join(where)
+            rows = conn.execute(sql + " ORDER BY project_id, year", args).fetchall()
+            return [{"projectId": project_id, "year": year, "payload": payload} for project_id, year, payload in rows]
+        return await self._call(work)
+
+    async def get_archive_segment(self, segment_id: str) -> Optional[dict]:
+        def work(conn):
+            row = conn.execute(
+                "SELECT doc, payload FROM project_history_archive WHERE id = ?", (segment_id,)
+            ).fetchone()
+            return {**orjson.loads(row[0]), "payload": row[1]} if row else None
+        return await self._call(work)
+
+    async def put_archive_segment(self, segment_id: str, segment: dict):
+        summary = {key: value for key, value in segment.items() if key != "payload"}
+        await self._call(lambda conn: conn.execute(
+            "INSERT OR REPLACE INTO project_history_archive (id, project_id, year, ends_at, doc, payload) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (segment_id, segment["projectId"], segment["year"], segment["to"], _dumps(summary), bytes(segment["payload"]))
+        ))
+
+    async def delete_archive(self, project_id: str):
+        await self._call(lambda conn: conn.execute(
+            "DELETE FROM project_history_archive WHERE project_id = ?", (project_id,)
+        ))
+
+    # Weekly snapshots
+    async def insert_weekly_snapshot(self, snapshot: dict, artifact: dict) -> bool:
+        """Store a closed week once; returns False when the week was already closed"""
+        def work(conn):
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO weekly_snapshots (week, doc) VALUES (?, ?)",
+                (snapshot["week"], _dumps(snapshot))
+            )
+            if cursor.rowcount == 0:
+                return False
+            self._put_artifact(conn, snapshot["week"], artifact)
+            return True
+        return await self._call(work)
+
+    @staticmethod
+    def _put_artifact(conn, week: str, artifact: dict):
+        summary = {key: value for key, value in artifact.items() if key != "data"}
+        conn.execute(
+            "INSERT OR REPLACE INTO weekly_snapshot_artifacts (week, doc, data) VALUES (?, ?, ?)",
+            (week, _dumps(summary), bytes(artifact["data"]))
+        )
+
+    async def put_weekly_artifact(self, week: str, artifact: dict):
+        await self._call(self._put_artifact, week, artifact)
+
+    async def list_weekly_snapshots(self, fields: Iterable[str], limit: int) -> List[dict]:
+        """Closed weeks, newest first"""
+        def work(conn):
+            rows = conn.execute("SELECT doc FROM weekly_snapshots ORDER BY week DESC LIMIT ?", (limit,)).fetchall()
+            return [_pick(orjson.loads(doc), fields) for doc, in rows]
+        return await self._call(work)
+
+    async def get_weekly_snapshot(self, week: str, fields: Optional[Iterable[str]] = None) -> Optional[dict]:
+        def work(conn):
+            row = conn.execute("SELECT doc FROM weekly_snapshots WHERE week = ?", (week,)).fetchone()
+            return _pick(orjson.loads(row[0]), fields) if row else None
+        return await self._call(work)
+
+    async def get_weekly_artifact(self, week: str) -> Optional[dict]:
+        def work(conn):
+            row = conn.execute("SELECT doc, data FROM weekly_snapshot_artifacts WHERE week = ?", (week,)).fetchone()
+            return {**orjson.loads(row[0]), "data": row[1]} if row else None
+        return await self._call(work)
+
+    # History diff cache
+    async def get_diff_page(self, key: str) -> Optional[dict]:
+        def work(conn):
+            row = conn.execute(
+                "SELECT page FROM history_diff_cache WHERE key = ? AND expires_at > ?",
+                (key, _now().isoformat())
+            ).fetchone()
+            return orjson.loads(row[0]) if row else None
+        return await self._call(work)
+
+    async def put_diff_page(self, key: str, project_id: str, page: dict, expires_at: datetime):
+        def work(conn):
+            conn.execute("DELETE FROM history_diff_cache WHERE expires_at <= ?", (_now().isoformat(),))
+            conn.execute(
+                "INSERT OR REPLACE INTO history_diff_cache (key, project_id, expires_at, page) VALUES (?, ?, ?, ?)",
+                (key, project_id, expires_at.isoformat(), _dumps(page))
+            )
+        await self._call(work)
+
+    async def drop_diff_pages(self, project_ids: List[str]):
+        await self._call(lambda conn: conn.execute(
+            f"DELETE FROM history_diff_cache WHERE project_id IN ({','.join('?' * len(project_ids))})",
+            project_ids
+        ))